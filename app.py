@@ -3,8 +3,23 @@ import hmac
 import hashlib
 import logging
 from datetime import datetime
+from typing import Optional
 from flask import Flask, request, jsonify
 from services.orchestrator import orchestrator
+from services.scheduler import scheduler, SchedulerFull
+from services.broadcast import broadcast_service
+from services.monitoring import vehicle_monitor
+from services.address_cache import address_cache
+from services.journal import journal
+from services.audit import audit_trail
+from services.fleet_cache import fleet_cache
+from services.prefetch import location_prefetcher
+from services.dedup import message_dedup
+from services.startup import warmup
+from services.metrics import metrics
+from clients.whatsapp import whatsapp_client
+from clients.tracker_api import tracker_api
+from services.cluster import cluster, ForwardFailed
 from services.session_manager import session_manager
 from config.settings import Config
 
@@ -16,8 +31,6 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-print("Chatbot WhatsApp iniciado!")
-
 def verify_signature(payload: bytes, signature: str) -> bool:
     if not Config.APP_SECRET:
         logger.warning("APP_SECRET nao configurado - verificacao de assinatura desabilitada")
@@ -34,14 +47,65 @@ def verify_signature(payload: bytes, signature: str) -> bool:
     
     return hmac.compare_digest(expected, signature)
 
+def verify_internal_token() -> bool:
+    if not Config.INTERNAL_API_TOKEN:
+        logger.warning("INTERNAL_API_TOKEN nao configurado - endpoints internos desabilitados")
+        return False
+    
+    auth = request.headers.get("Authorization", "")
+    return hmac.compare_digest(f"Bearer {Config.INTERNAL_API_TOKEN}", auth)
+
+def accept_message(phone_number: str, text: str, message_type: str, message_id: str) -> None:
+    try:
+        # Durável antes de responder 200 (Meta não reenvia)
+        journal.record_inbound(phone_number, message_id, message_type, text)
+    except Exception as e:
+        logger.error(f"Erro ao gravar journal: {e}", exc_info=True)
+    dispatch_message(phone_number, text, message_type, message_id)
+
+def dispatch_message(phone_number: str, text: str, message_type: str, message_id: str, wait: bool = True) -> None:
+    if Config.SCHEDULER_ENABLED:
+        # Fila de prioridade: bloqueio/desbloqueio na frente
+        # (fila cheia: SchedulerFull -> 503 e a Meta reenvia)
+        scheduler.submit(phone_number, text, message_type, message_id, wait=wait)
+    else:
+        orchestrator.process_message(phone_number, text, message_type, message_id)
+
 @app.route("/health", methods=["GET"])
 def health():
+    # Tempo constante: só lê contadores (sondado com frequência pelo balanceador)
     return jsonify({
         "status": "healthy",
         "active_sessions": session_manager.get_active_count(),
         "timestamp": datetime.now().isoformat()
     })
 
+@app.route("/ready", methods=["GET"])
+def ready():
+    # 503 enquanto o aquecimento não termina (balanceador ainda não envia tráfego)
+    return jsonify({
+        "status": "ready" if warmup.ready else "warming_up",
+        **warmup.get_stats()
+    }), 200 if warmup.ready else 503
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify({
+        "sessions": session_manager.get_stats(),
+        "rates": metrics.get_stats(),
+        "scheduler": scheduler.get_stats(),
+        "monitoring": vehicle_monitor.get_stats(),
+        "address_cache": address_cache.get_stats(),
+        "journal": journal.get_stats(),
+        "audit": audit_trail.get_stats(),
+        "fleet_cache": fleet_cache.get_stats(),
+        "prefetch": location_prefetcher.get_stats(),
+        "dedup": message_dedup.get_stats(),
+        "startup": warmup.get_stats(),
+        "cluster": cluster.get_stats(),
+        "timestamp": datetime.now().isoformat()
+    })
+
 @app.route("/webhook", methods=["GET"])
 def verify_webhook():
     mode = request.args.get("hub.mode")
@@ -105,16 +169,120 @@ def webhook():
                     # Processar mensagem se tiver conteúdo
                     if phone_number and text:
                         logger.info(f"Processando: {phone_number} | {message_type} | '{text}' | ID: {message_id}")
-                        orchestrator.process_message(phone_number, text, message_type, message_id)
+                        # Modo cluster: a sessão vive no nó dono do telefone
+                        if not cluster.is_local(phone_number) and cluster.forward(phone_number, text, message_type, message_id):
+                            continue
+                        accept_message(phone_number, text, message_type, message_id)
                     else:
                         logger.debug(f"Mensagem ignorada - phone: {phone_number}, text: '{text}'")
         
         return jsonify({"status": "ok"}), 200
     
+    except (SchedulerFull, ForwardFailed) as e:
+        # Mensagens já enfileiradas (ou entregues ao dono) deste payload são descartadas pela deduplicação no reenvio
+        logger.warning(f"Webhook recusado: {e}")
+        return jsonify({"status": "busy"}), 503
+    
     except Exception as e:
         logger.error(f"Erro no webhook: {e}", exc_info=True)
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route("/internal/forward", methods=["POST"])
+def internal_forward():
+    payload = request.get_data()
+    if not cluster.verify(payload, request.headers.get("X-Cluster-Signature", "")):
+        logger.warning(f"Assinatura invalida em /internal/forward (origem: {request.headers.get('X-Cluster-Node')})")
+        return "Unauthorized", 401
+    
+    data = request.get_json(silent=True) or {}
+    phone_number = data.get("phone_number")
+    text = data.get("text")
+    if not phone_number or not text:
+        return jsonify({"status": "error", "message": "phone_number e text obrigatorios"}), 400
+    
+    # Não repassar de novo: evita laço se as configurações dos nós divergirem
+    cluster.record_received()
+    try:
+        accept_message(phone_number, text, data.get("message_type", "text"), data.get("message_id"))
+    except SchedulerFull as e:
+        logger.warning(f"Repasse recusado: {e}")
+        return jsonify({"status": "busy"}), 503
+    return jsonify({"status": "ok"}), 200
+
+def invalid_recipient(recipient, language) -> Optional[str]:
+    """Motivo pelo qual o destinatário do broadcast é inválido (None se válido)"""
+    if isinstance(recipient, (str, int)) and not isinstance(recipient, bool):
+        return None if str(recipient).strip() else "telefone vazio"
+    if not isinstance(recipient, dict):
+        return "deve ser telefone ou objeto {to, params}"
+    to = recipient.get("to")
+    if not isinstance(to, (str, int)) or isinstance(to, bool) or not str(to).strip():
+        return "to deve ser um telefone"
+    params = recipient.get("params")
+    if params is None:
+        return None
+    if language:
+        if not isinstance(params, list) or not all(isinstance(p, (str, int, float)) for p in params):
+            return "params deve ser uma lista de textos (template Meta)"
+    elif not isinstance(params, dict):
+        return "params deve ser um objeto {placeholder: valor}"
+    return None
+
+@app.route("/broadcast", methods=["POST"])
+def broadcast():
+    if not verify_internal_token():
+        return "Unauthorized", 401
+    
+    data = request.get_json(silent=True) or {}
+    recipients = data.get("recipients")
+    template = data.get("template")
+    language = data.get("language")
+    
+    if not isinstance(recipients, list) or not recipients:
+        return jsonify({"status": "error", "message": "recipients deve ser uma lista nao vazia"}), 400
+    if not isinstance(template, str) or not template:
+        return jsonify({"status": "error", "message": "template obrigatorio"}), 400
+    if len(recipients) > Config.BROADCAST_MAX_RECIPIENTS:
+        return jsonify({"status": "error", "message": f"maximo de {Config.BROADCAST_MAX_RECIPIENTS} destinatarios"}), 400
+    if language is not None and not isinstance(language, str):
+        return jsonify({"status": "error", "message": "language deve ser texto"}), 400
+    for i, recipient in enumerate(recipients):
+        reason = invalid_recipient(recipient, language)
+        if reason:
+            return jsonify({"status": "error", "message": f"recipients[{i}]: {reason}"}), 400
+    
+    job_id = broadcast_service.start(recipients, template, language)
+    return jsonify({"status": "accepted", "job_id": job_id}), 202
+
+@app.route("/broadcast/<job_id>", methods=["GET"])
+def broadcast_status(job_id):
+    if not verify_internal_token():
+        return "Unauthorized", 401
+    
+    job = broadcast_service.get(job_id)
+    if not job:
+        return jsonify({"status": "error", "message": "job nao encontrado"}), 404
+    return jsonify(job)
+
+@app.route("/audit", methods=["GET"])
+def audit():
+    if not verify_internal_token():
+        return "Unauthorized", 401
+    
+    try:
+        since = request.args.get("since")
+        until = request.args.get("until")
+        events = audit_trail.query(
+            vehicle_id=request.args.get("vehicle_id"),
+            since=datetime.fromisoformat(since).timestamp() if since else None,
+            until=datetime.fromisoformat(until).timestamp() if until else None,
+            limit=max(1, min(int(request.args.get("limit", 100)), 1000))
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    
+    return jsonify({"events": events, "count": len(events)})
+
 @app.route("/", methods=["GET"])
 def index():
     return jsonify({
@@ -123,10 +291,43 @@ def index():
         "status": "running",
         "endpoints": {
             "/health": "Health check",
-            "/webhook": "WhatsApp webhook (GET para verificacao, POST para mensagens)"
+            "/ready": "Pronto para receber trafego (503 durante o aquecimento)",
+            "/stats": "Estatisticas de sessoes e filas de prioridade",
+            "/webhook": "WhatsApp webhook (GET para verificacao, POST para mensagens)",
+            "/broadcast": "Envio em massa (interno, POST) e andamento em /broadcast/<job_id>",
+            "/audit": "Auditoria de comandos (interno; vehicle_id, since, until, limit)",
+            "/internal/forward": "Mensagem repassada por outro no do cluster (interno)"
         }
     })
 
+def redeliver_message(phone_number: str, text: str, message_type: str, message_id: str) -> None:
+    # O worker que morreu já tinha reivindicado a mensagem na tabela compartilhada
+    message_dedup.release(message_id)
+    dispatch_message(phone_number, text, message_type, message_id, wait=False)
+
+if Config.SCHEDULER_ENABLED and not journal.enabled:
+    logger.warning("SCHEDULER_ENABLED sem JOURNAL_DIR: mensagens na fila se perdem se o worker cair")
+
+# Reprocessar mensagens que ficaram sem conclusão em workers que morreram
+if journal.enabled:
+    journal.recover(redeliver_message)
+
+def _import_numpy():
+    import numpy  # usado pelo monitoramento de alertas
+
+# Aquecimento (WARMUP_ENABLED): conexões, snapshot de sessões e caches
+warmup.add("whatsapp_connection", whatsapp_client.warm_up)
+warmup.add("tracker_connection", tracker_api.warm_up)
+warmup.add("session_snapshot", session_manager.load_snapshot)
+warmup.add("address_cache", address_cache.load)
+warmup.add("numpy", _import_numpy)
+warmup.start()
+
+# Sem aquecimento o snapshot é reivindicado (e os antigos apagados) aqui mesmo:
+# todo worker que grava o seu ao sair também consome um ao iniciar
+if not warmup.enabled:
+    session_manager.load_snapshot()
+
 if __name__ == "__main__":
     print("Iniciando servidor Flask...")
     app.run(host="0.0.0.0", port=5000, debug=False)
\ No newline at end of file
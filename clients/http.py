@@ -0,0 +1,53 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LazyHttpSession:
+    """
+    requests.Session com pool de conexões, criado no primeiro uso.
+
+    O import de `requests` (~50 ms) também fica para o primeiro uso,
+    fora da importação do app.
+    """
+
+    def __init__(self, pool_maxsize: int = 10):
+        self.pool_maxsize = pool_maxsize
+        self._session = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_maxsize=self.pool_maxsize)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    def warm_up(self, url: Optional[str], timeout: float = 5.0) -> Optional[float]:
+        """
+        Abre uma conexão (TCP + TLS) e a deixa no pool.
+
+        Qualquer resposta HTTP serve; só importa a conexão.
+
+        Returns:
+            float: Segundos gastos, ou None se não conectou
+        """
+        session = self.get()
+        if not url:
+            return None
+        started_at = time.monotonic()
+        try:
+            session.head(url, timeout=timeout)
+        except Exception as e:
+            logger.warning(f"[WARMUP] Nao foi possivel conectar em {url}: {e}")
+            return None
+        return time.monotonic() - started_at
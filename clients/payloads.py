@@ -0,0 +1,139 @@
+"""
+Payloads da API do WhatsApp montados direto em bytes.
+
+As partes fixas de cada tipo de mensagem (envelope, botões de
+navegação, esqueleto da lista) são serializadas uma única vez na
+importação; a cada envio só os campos variáveis (destinatário, texto,
+linhas da lista) passam pelo escape de string JSON (implementado em C
+na biblioteca padrão) e são concatenados.
+"""
+import json
+from json.encoder import encode_basestring
+from typing import Iterable, Sequence, Union
+
+BUTTON_TITLE_MAX = 20
+MAX_BUTTONS = 3
+
+
+def encode_str(value) -> bytes:
+    """String JSON (com aspas) em UTF-8"""
+    return encode_basestring(str(value)).encode()
+
+
+def dumps(obj) -> bytes:
+    """Serialização genérica (payloads sem template)"""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class Button:
+    """Botão de resposta pré-serializado"""
+
+    __slots__ = ("id", "title", "encoded")
+
+    def __init__(self, id: str, title: str):
+        self.id = id
+        self.title = title[:BUTTON_TITLE_MAX]
+        self.encoded = (
+            b'{"type":"reply","reply":{"id":' + encode_str(self.id)
+            + b',"title":' + encode_str(self.title) + b'}}'
+        )
+
+
+class ButtonSet:
+    """Lista de botões (até 3) com o array JSON já serializado"""
+
+    __slots__ = ("buttons", "encoded")
+
+    def __init__(self, *buttons: Button):
+        self.buttons = buttons[:MAX_BUTTONS]
+        self.encoded = b"[" + b",".join(b.encoded for b in self.buttons) + b"]"
+
+
+def as_button_set(buttons: Union[ButtonSet, Sequence]) -> ButtonSet:
+    """Aceita ButtonSet, Buttons ou dicts {"id", "title"} (formato antigo)"""
+    if isinstance(buttons, ButtonSet):
+        return buttons
+    return ButtonSet(*(
+        b if isinstance(b, Button) else Button(b.get("id", f"btn_{i}"), b.get("title", f"Opcao {i+1}"))
+        for i, b in enumerate(buttons[:MAX_BUTTONS])
+    ))
+
+
+_TO = b'{"messaging_product":"whatsapp","to":'
+_TEXT = b',"type":"text","text":{"body":'
+_TEXT_END = b'}}'
+_BUTTONS = b',"type":"interactive","interactive":{"type":"button","body":{"text":'
+_BUTTONS_ACTION = b'},"action":{"buttons":'
+_BUTTONS_END = b'}}}'
+_LIST = b',"type":"interactive","interactive":{"type":"list","body":{"text":'
+_LIST_END = b']}]}}}'
+
+
+def text_payload(to: str, body: str) -> bytes:
+    return b"".join((_TO, encode_str(to), _TEXT, encode_str(body), _TEXT_END))
+
+
+def buttons_payload(to: str, body: str, buttons: Union[ButtonSet, Sequence]) -> bytes:
+    return b"".join((
+        _TO, encode_str(to), _BUTTONS, encode_str(body),
+        _BUTTONS_ACTION, as_button_set(buttons).encoded, _BUTTONS_END
+    ))
+
+
+class ListTemplate:
+    """
+    Mensagem de lista com texto do botão e seção únicos fixos;
+    render() recebe só as linhas (id, title, description).
+    """
+
+    def __init__(self, button_text: str, section_title: str):
+        self.button_text = button_text
+        self.section_title = section_title
+        self._action = (
+            b'},"action":{"button":' + encode_str(button_text)
+            + b',"sections":[{"title":' + encode_str(section_title) + b',"rows":['
+        )
+
+    def render(self, to: str, body: str, rows: Iterable[tuple]) -> bytes:
+        encoded_rows = b",".join(
+            b'{"id":' + encode_str(row_id) + b',"title":' + encode_str(title)
+            + b',"description":' + encode_str(description) + b'}'
+            for row_id, title, description in rows
+        )
+        return b"".join((
+            _TO, encode_str(to), _LIST, encode_str(body),
+            self._action, encoded_rows, _LIST_END
+        ))
+
+
+def list_payload(to: str, body: str, button_text: str, sections: list) -> bytes:
+    """Lista com seções arbitrárias (sem template)"""
+    return b"".join((
+        _TO, encode_str(to), _LIST, encode_str(body),
+        b'},"action":{"button":', encode_str(button_text),
+        b',"sections":', dumps(sections), b'}}}'
+    ))
+
+
+# Botões fixos do menu do veículo
+BUTTON_LOCATION = Button("localizacao", "Localizacao")
+BUTTON_BLOCK = Button("bloquear", "Bloquear")
+BUTTON_UNBLOCK = Button("desbloquear", "Desbloquear")
+BUTTON_MENU = Button("menu", "Menu")
+BUTTON_BACK = Button("voltar", "Voltar")
+BUTTON_EXIT = Button("sair", "Sair")
+
+# Navegação após uma ação (com "Menu" só para quem tem mais de um veículo)
+NAV_BUTTONS = ButtonSet(BUTTON_BACK, BUTTON_EXIT)
+NAV_BUTTONS_MULTI = ButtonSet(BUTTON_BACK, BUTTON_MENU, BUTTON_EXIT)
+
+# Opções do veículo por (bloqueado, vários veículos); com vários, "Menu"
+# ocupa o terceiro botão (limite de 3) e "Sair" fica de fora
+VEHICLE_BUTTONS = {
+    (False, False): ButtonSet(BUTTON_LOCATION, BUTTON_BLOCK, BUTTON_EXIT),
+    (True, False): ButtonSet(BUTTON_LOCATION, BUTTON_UNBLOCK, BUTTON_EXIT),
+    (False, True): ButtonSet(BUTTON_LOCATION, BUTTON_BLOCK, BUTTON_MENU),
+    (True, True): ButtonSet(BUTTON_LOCATION, BUTTON_UNBLOCK, BUTTON_MENU)
+}
+
+VEHICLE_LIST = ListTemplate("Ver Veiculos", "Seus Veiculos")
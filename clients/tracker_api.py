@@ -1,8 +1,11 @@
 import logging
-from typing import Optional, Dict, List
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Tuple
 from config.settings import Config
 from models.entities import User, Vehicle
-import requests
+from clients.http import LazyHttpSession
 
 logger = logging.getLogger(__name__)
 
@@ -10,10 +13,38 @@ class TrackerAPI:
     def __init__(self):
         self.url = Config.API_BASE_URL
         self.request_timeout = Config.SESSION_TIMEOUT_MINUTES
+        self.fetch_concurrency = Config.TRACKER_FETCH_CONCURRENCY
+        
+        # Conexões reaproveitadas entre consultas, abertas no primeiro uso
+        self._http = LazyHttpSession(pool_maxsize=self.fetch_concurrency)
+        
+        # Um pool de consultas para o processo inteiro (alertas, resumo da frota):
+        # a concorrência com o backend não passa de fetch_concurrency
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self._executor_lock = threading.Lock()
+    
+    @property
+    def http(self):
+        return self._http.get()
+    
+    def _pool(self) -> ThreadPoolExecutor:
+        """Pool compartilhado, criado no primeiro uso (de novo após fork)"""
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            with self._executor_lock:
+                if self._executor is None or self._executor_pid != pid:
+                    self._executor = ThreadPoolExecutor(max_workers=self.fetch_concurrency, thread_name_prefix="tracker")
+                    self._executor_pid = pid
+        return self._executor
+    
+    def warm_up(self) -> None:
+        """Abre a conexão com o backend de rastreamento antes da primeira consulta"""
+        self._http.warm_up(self.url)
     
     def authenticate(self, identifier: str, password: str, url: str) -> Optional[User]:
         
-        response = requests.post(f"{self.url}/{url}",
+        response = self.http.post(f"{self.url}/{url}",
                                      json={
                                          'identifier': identifier,
                                          'password': password
@@ -26,34 +57,56 @@ class TrackerAPI:
                 token=data['access_token']
             )
 
-            Vehicle_response = requests.get(f"{self.url}//tracking/vehicles",
+            return user
+        return None
+
+    def get_vehicles(self, token: str) -> Optional[List[Vehicle]]:
+        """
+        Lista os veículos acessíveis com o token.
+        
+        Returns:
+            List[Vehicle] ou None se a consulta falhou
+        """
+        return self.fetch_vehicles(token)[0]
+    
+    def fetch_vehicles(self, token: str) -> Tuple[Optional[List[Vehicle]], Optional[int]]:
+        """Veículos do token e status HTTP da consulta (status None se a requisição falhou)"""
+        try:
+            Vehicle_response = self.http.get(f"{self.url}//tracking/vehicles",
                                      headers={
-                                            'Authorization': f'Bearer {user.token}',
+                                            'Authorization': f'Bearer {token}',
                                             'Accept': 'application/json',
                                             'Content-Type': 'application/json'
                                         },
                                      timeout=self.request_timeout)
             
-            if Vehicle_response.status_code == 200:
-                vehicles_data = Vehicle_response.json()
-                vehicles = []
-                for v in vehicles_data["vehicles"]:
-                    vehicle = Vehicle(
-                        id=v.get("id"),
-                        plate=v.get("plate"),
-                        model=v.get("model"),
-                        blocked=v.get("block"),
-                        is_blocked=v.get("block") == "bloqueado"
-                    )
-                    vehicles.append(vehicle)
-                user.vehicles = vehicles
-
-            return user
-        return None
+            if Vehicle_response.status_code != 200:
+                logger.warning(f"Falha ao listar veiculos: status {Vehicle_response.status_code}")
+                return None, Vehicle_response.status_code
+            
+            vehicles_data = Vehicle_response.json()
+            vehicles = []
+            for v in vehicles_data["vehicles"]:
+                vehicle = Vehicle(
+                    id=v.get("id"),
+                    plate=v.get("plate"),
+                    model=v.get("model"),
+                    blocked=v.get("block"),
+                    is_blocked=v.get("block") == "bloqueado"
+                )
+                vehicles.append(vehicle)
+            return vehicles, Vehicle_response.status_code
+        except Exception as e:
+            logger.error(f"Erro ao listar veiculos: {e}")
+            return None, None
 
     def get_vehicle_location(self, vehicle_id: str, token: str) -> Optional[Dict]:
+        return self._fetch_location(vehicle_id, token)[0]
+    
+    def _fetch_location(self, vehicle_id: str, token: str) -> Tuple[Optional[Dict], Optional[int]]:
+        """Localização e status HTTP da consulta (status None se a requisição falhou)"""
         try:
-            response = requests.get(f"{self.url}/tracking/vehicles/{vehicle_id}/location",
+            response = self.http.get(f"{self.url}/tracking/vehicles/{vehicle_id}/location",
                                          headers={
                                                 'Authorization': f'Bearer {token}',
                                                 'Accept': 'application/json',
@@ -69,17 +122,47 @@ class TrackerAPI:
                     "speed": data["location"].get("speed"),
                     "last_update": data["location"].get("timestamp")
                 }
-                return locations
+                return locations, response.status_code
             else:
                 logger.warning(f"Falha ao obter localização: status {response.status_code}")
-                return None
+                return None, response.status_code
         except Exception as e:
             logger.error(f"Erro ao obter localização do veículo {vehicle_id}: {e}")
-            return None
+            return None, None
+    
+    def get_vehicle_locations(self, vehicle_ids: List[str], token: str) -> Dict[str, Optional[Dict]]:
+        """
+        Busca a localização de vários veículos em paralelo.
+        
+        A API não tem endpoint em lote, então as consultas individuais
+        são disparadas no pool compartilhado (fetch_concurrency).
+        
+        Returns:
+            Dict: vehicle_id -> localização (None se a consulta falhou)
+        """
+        if not vehicle_ids:
+            return {}
+        
+        locations = self._pool().map(lambda vid: self.get_vehicle_location(vid, token), vehicle_ids)
+        return dict(zip(vehicle_ids, locations))
+    
+    def fetch_locations(self, pairs: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Tuple[Optional[Dict], Optional[int]]]:
+        """
+        Busca pares (vehicle_id, token) de vários usuários no pool
+        compartilhado (fetch_concurrency).
+        
+        Returns:
+            Dict: (vehicle_id, token) -> (localização ou None, status HTTP)
+        """
+        if not pairs:
+            return {}
+        
+        results = self._pool().map(lambda pair: self._fetch_location(*pair), pairs)
+        return dict(zip(pairs, results))
     
     def block_vehicle(self, vehicle_id: str, token: str) -> bool:
     
-        response = requests.post(f"{self.url}/vehicles/{vehicle_id}/block",
+        response = self.http.post(f"{self.url}/vehicles/{vehicle_id}/block",
                                 headers={
                                     'Authorization': f'Bearer {token}',
                                     'Accept': 'application/json',
@@ -95,7 +178,7 @@ class TrackerAPI:
         return True
     
     def unblock_vehicle(self, vehicle_id: str, token: str) -> bool:
-        response = requests.post(f"{self.url}/vehicles/{vehicle_id}/block",
+        response = self.http.post(f"{self.url}/vehicles/{vehicle_id}/block",
                                 headers={
                                     'Authorization': f'Bearer {token}',
                                     'Accept': 'application/json',
@@ -1,66 +1,91 @@
-import requests
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple, Union
 from config.settings import Config
+from clients.http import LazyHttpSession
+from clients import payloads
+from clients.payloads import ButtonSet, ListTemplate
 
 logger = logging.getLogger(__name__)
 
+class RateLimiter:
+    """
+    Token bucket simples e thread-safe.
+
+    Libera no máximo `rate` chamadas por segundo (com rajada de até `rate`).
+    """
+
+    def __init__(self, rate: float):
+        self.rate = float(rate)
+        self.tokens = float(rate)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
 class WhatsAppClient:
     def __init__(self):
         self.api_url = Config.WHATSAPP_API_URL
         self.token = Config.WHATSAPP_TOKEN
         self.phone_number_id = Config.PHONE_NUMBER_ID
-    
-    def _get_headers(self):
-        return {
+        self.bulk_concurrency = Config.WHATSAPP_BULK_CONCURRENCY
+        self.bulk_rate = Config.WHATSAPP_BULK_RATE
+        self.bulk_retries = 2
+        # Um limite para a conta inteira: broadcasts e alertas simultâneos dividem a mesma vazão
+        self.bulk_limiter = RateLimiter(self.bulk_rate)
+
+        # Conexões reaproveitadas (keep-alive) entre envios, abertas no primeiro uso
+        self._http = LazyHttpSession(pool_maxsize=self.bulk_concurrency)
+        self._messages_url = f"{self.api_url}/{self.phone_number_id}/messages"
+        self._headers = {
             "Authorization": f"Bearer {self.token}",
             "Content-Type": "application/json"
         }
     
+    @property
+    def http(self):
+        return self._http.get()
+    
+    def warm_up(self) -> None:
+        """Abre a conexão com a API do WhatsApp antes da primeira mensagem"""
+        self._http.warm_up(self.api_url)
+    
+    def _send(self, payload: bytes):
+        """POST do payload já serializado (clients/payloads.py)"""
+        response = self.http.post(self._messages_url, headers=self._headers, data=payload)
+        response.raise_for_status()
+        return response
+    
     def send_message(self, to: str, message: str) -> bool:
-        url = f"{self.api_url}/{self.phone_number_id}/messages"
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": to,
-            "type": "text",
-            "text": {"body": message}
-        }
-        
         try:
-            response = requests.post(url, headers=self._get_headers(), json=payload)
-            response.raise_for_status()
+            self._send(payloads.text_payload(to, message))
             logger.info(f"Mensagem enviada para {to}")
             return True
         except Exception as e:
             logger.error(f"Erro ao enviar mensagem: {e}")
             return False
     
-    def send_interactive_buttons(self, to: str, body: str, buttons: list) -> bool:
-        url = f"{self.api_url}/{self.phone_number_id}/messages"
-        
-        button_list = []
-        for i, btn in enumerate(buttons[:3]):
-            button_list.append({
-                "type": "reply",
-                "reply": {
-                    "id": btn.get("id", f"btn_{i}"),
-                    "title": btn.get("title", f"Opcao {i+1}")[:20]
-                }
-            })
-        
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": to,
-            "type": "interactive",
-            "interactive": {
-                "type": "button",
-                "body": {"text": body},
-                "action": {"buttons": button_list}
-            }
-        }
+    def send_interactive_buttons(self, to: str, body: str, buttons: Union[ButtonSet, list]) -> bool:
+        """
+        Envia texto com até 3 botões de resposta.
         
+        Args:
+            buttons: ButtonSet pré-serializado ou lista de Button/dicts {"id", "title"}
+        """
         try:
-            response = requests.post(url, headers=self._get_headers(), json=payload)
-            response.raise_for_status()
+            self._send(payloads.buttons_payload(to, body, buttons))
             logger.info(f"Botoes enviados para {to}")
             return True
         except Exception as e:
@@ -68,29 +93,147 @@ class WhatsAppClient:
             return False
     
     def send_list(self, to: str, body: str, button_text: str, sections: list) -> bool:
-        url = f"{self.api_url}/{self.phone_number_id}/messages"
-        
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": to,
-            "type": "interactive",
-            "interactive": {
-                "type": "list",
-                "body": {"text": body},
-                "action": {
-                    "button": button_text,
-                    "sections": sections
-                }
-            }
-        }
-        
         try:
-            response = requests.post(url, headers=self._get_headers(), json=payload)
-            response.raise_for_status()
+            self._send(payloads.list_payload(to, body, button_text, sections))
             logger.info(f"Lista enviada para {to}")
             return True
         except Exception as e:
             logger.error(f"Erro ao enviar lista: {e}")
             return False
+    
+    def send_list_template(self, to: str, body: str, template: ListTemplate, rows) -> bool:
+        """Lista de seção única com esqueleto pré-serializado; rows = (id, title, description)"""
+        try:
+            self._send(template.render(to, body, rows))
+            logger.info(f"Lista enviada para {to}")
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao enviar lista: {e}")
+            return False
+
+    def send_template(self, to: str, template_name: str, language: str, parameters: list = None) -> bool:
+        """
+        Envia uma mensagem de template aprovado pela Meta.
+
+        Necessário para mensagens ativas fora da janela de 24h.
+        """
+        payload = self._template_payload(to, template_name, language, parameters or [])
+        success, error, _ = self._post(payload)
+        if success:
+            logger.info(f"Template {template_name} enviado para {to}")
+        else:
+            logger.error(f"Erro ao enviar template: {error}")
+        return success
+
+    def send_bulk(
+        self,
+        recipients: List[Union[str, dict]],
+        template: str,
+        language: Optional[str] = None,
+        on_result: Optional[Callable[[dict], None]] = None
+    ) -> dict:
+        """
+        Envia a mesma mensagem para vários destinatários.
+
+        Os envios são feitos em paralelo (bulk_concurrency) respeitando
+        o limite de bulk_rate mensagens/segundo, compartilhado por todos
+        os envios em massa do processo. Falhas individuais (inclusive
+        parâmetros inválidos) viram resultado com erro e não interrompem
+        o envio para os demais.
+
+        Args:
+            recipients: Telefones ou dicts {"to": telefone, "params": ...}
+            template: Texto com placeholders ({nome}) preenchidos por "params",
+                ou nome do template Meta quando `language` é informado
+                (nesse caso "params" é a lista de parâmetros do corpo)
+            language: Código do idioma do template Meta (ex: "pt_BR")
+            on_result: Callback chamado com o resultado de cada destinatário
+
+        Returns:
+            dict: Totais, vazão (mensagens/segundo) e resultado por destinatário
+        """
+        started_at = time.monotonic()
+
+        def deliver(recipient):
+            if isinstance(recipient, dict):
+                to = str(recipient.get("to", ""))
+                params = recipient.get("params")
+            else:
+                to = str(recipient)
+                params = None
+
+            try:
+                if language:
+                    payload = self._template_payload(to, template, language, params or [])
+                else:
+                    payload = payloads.text_payload(to, template.format(**(params or {})))
+            except Exception as e:
+                result = {"to": to, "success": False, "error": f"Parametros invalidos: {type(e).__name__}: {e}"}
+            else:
+                result = self._post_with_retry(payload)
+                result["to"] = to
+
+            if on_result:
+                on_result(result)
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.bulk_concurrency) as executor:
+            results = list(executor.map(deliver, recipients))
+
+        elapsed = time.monotonic() - started_at
+        sent = sum(1 for r in results if r["success"])
+        throughput = round(len(results) / elapsed, 2) if elapsed > 0 else 0.0
+        logger.info(f"Envio em massa concluido: {sent}/{len(results)} em {elapsed:.2f}s ({throughput} msg/s)")
+
+        return {
+            "total": len(results),
+            "sent": sent,
+            "failed": len(results) - sent,
+            "elapsed_seconds": round(elapsed, 3),
+            "messages_per_second": throughput,
+            "results": results
+        }
+
+    def _post_with_retry(self, payload: bytes) -> dict:
+        """Envia respeitando o rate limit, com novas tentativas em 429/5xx"""
+        error = None
+        for attempt in range(self.bulk_retries + 1):
+            self.bulk_limiter.acquire()
+            success, error, status = self._post(payload)
+            if success:
+                return {"success": True, "error": None}
+            if status is not None and status != 429 and status < 500:
+                break
+            if attempt < self.bulk_retries:
+                time.sleep(0.5 * (2 ** attempt))
+        return {"success": False, "error": error}
+
+    def _post(self, payload: bytes) -> Tuple[bool, Optional[str], Optional[int]]:
+        """Retorna (sucesso, erro, status HTTP)"""
+        status = None
+        try:
+            response = self.http.post(self._messages_url, headers=self._headers, data=payload, timeout=10)
+            status = response.status_code
+            response.raise_for_status()
+            return True, None, status
+        except Exception as e:
+            return False, str(e), status
+
+    def _template_payload(self, to: str, template_name: str, language: str, parameters: list) -> bytes:
+        template = {
+            "name": template_name,
+            "language": {"code": language}
+        }
+        if parameters:
+            template["components"] = [{
+                "type": "body",
+                "parameters": [{"type": "text", "text": str(p)} for p in parameters]
+            }]
+        return payloads.dumps({
+            "messaging_product": "whatsapp",
+            "to": to,
+            "type": "template",
+            "template": template
+        })
 
 whatsapp_client = WhatsAppClient()
@@ -10,3 +10,106 @@ class Config:
     API_BASE_URL = os.getenv("API_BASE_URL", "")
     SESSION_TIMEOUT_MINUTES = int(os.getenv("SESSION_TIMEOUT_MINUTES", 30))
     SESSION_SECRET = os.getenv("SESSION_SECRET", "")
+
+    # Fila de prioridade (bloqueio/desbloqueio antes de consultas e navegação).
+    # O webhook responde 200 antes de processar: sem JOURNAL_DIR, mensagens
+    # na fila se perdem se o worker cair (no máximo uma vez)
+    SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "false").lower() == "true"
+    SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", 4))
+    SCHEDULER_MAX_WAIT_MS = int(os.getenv("SCHEDULER_MAX_WAIT_MS", 2000))
+    SCHEDULER_MAX_PENDING = int(os.getenv("SCHEDULER_MAX_PENDING", 1000))
+    SCHEDULER_SUBMIT_TIMEOUT_MS = int(os.getenv("SCHEDULER_SUBMIT_TIMEOUT_MS", 5000))  # fila cheia: espera antes do 503
+
+    # Endpoints internos (broadcast etc) - Authorization: Bearer <token>
+    INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "")
+
+    # Envio em massa
+    WHATSAPP_BULK_CONCURRENCY = int(os.getenv("WHATSAPP_BULK_CONCURRENCY", 16))
+    WHATSAPP_BULK_RATE = float(os.getenv("WHATSAPP_BULK_RATE", 80))
+    BROADCAST_MAX_RECIPIENTS = int(os.getenv("BROADCAST_MAX_RECIPIENTS", 10000))
+    BROADCAST_MAX_JOBS = int(os.getenv("BROADCAST_MAX_JOBS", 50))
+
+    # Consultas paralelas à API de rastreamento
+    TRACKER_FETCH_CONCURRENCY = int(os.getenv("TRACKER_FETCH_CONCURRENCY", 32))
+
+    # Monitoramento ativo (alertas de cerca, velocidade e movimento bloqueado)
+    MONITOR_POLL_INTERVAL_SECONDS = int(os.getenv("MONITOR_POLL_INTERVAL_SECONDS", 60))
+    MONITOR_MOVING_SPEED_KMH = float(os.getenv("MONITOR_MOVING_SPEED_KMH", 5))
+    MONITOR_MOVING_DISTANCE_M = float(os.getenv("MONITOR_MOVING_DISTANCE_M", 100))
+    MONITOR_DEFAULT_SPEED_LIMIT = float(os.getenv("MONITOR_DEFAULT_SPEED_LIMIT", 120))
+    MONITOR_DEFAULT_GEOFENCE_RADIUS_M = float(os.getenv("MONITOR_DEFAULT_GEOFENCE_RADIUS_M", 500))
+    # Template aprovado na Meta com corpo "{{1}}\n\nMaps: {{2}}"
+    MONITOR_ALERT_TEMPLATE = os.getenv("MONITOR_ALERT_TEMPLATE", "alerta_veiculo")
+    MONITOR_ALERT_LANGUAGE = os.getenv("MONITOR_ALERT_LANGUAGE", "pt_BR")
+    MONITOR_MAX_AUTH_FAILURES = int(os.getenv("MONITOR_MAX_AUTH_FAILURES", 3))
+
+    # Cache de endereços por coordenada (geohash)
+    ADDRESS_CACHE_PRECISION = int(os.getenv("ADDRESS_CACHE_PRECISION", 7))
+    ADDRESS_CACHE_MAX_ENTRIES = int(os.getenv("ADDRESS_CACHE_MAX_ENTRIES", 50000))
+    ADDRESS_CACHE_PATH = os.getenv("ADDRESS_CACHE_PATH", "")
+    ADDRESS_CACHE_SAVE_EVERY = int(os.getenv("ADDRESS_CACHE_SAVE_EVERY", 100))
+    ADDRESS_CACHE_SAVE_DELAY_SECONDS = float(os.getenv("ADDRESS_CACHE_SAVE_DELAY_SECONDS", 5))
+
+    # Journal de mensagens recebidas (vazio = desabilitado)
+    JOURNAL_DIR = os.getenv("JOURNAL_DIR", "")
+    JOURNAL_MAX_BYTES = int(os.getenv("JOURNAL_MAX_BYTES", 16 * 1024 * 1024))
+    JOURNAL_FLUSH_INTERVAL_MS = int(os.getenv("JOURNAL_FLUSH_INTERVAL_MS", 50))
+
+    # Idempotência de bloqueio/desbloqueio ("" = memória do processo,
+    # "sqlite:///caminho/commands.db" = compartilhado entre workers)
+    COMMAND_STORE_URL = os.getenv("COMMAND_STORE_URL", "")
+    COMMAND_IDEMPOTENCY_TTL_SECONDS = int(os.getenv("COMMAND_IDEMPOTENCY_TTL_SECONDS", 30))
+    COMMAND_INFLIGHT_TIMEOUT_SECONDS = int(os.getenv("COMMAND_INFLIGHT_TIMEOUT_SECONDS", 60))
+    COMMAND_WAIT_TIMEOUT_SECONDS = int(os.getenv("COMMAND_WAIT_TIMEOUT_SECONDS", 20))
+
+    # Auditoria de comandos (SQLite, gravado em lotes; vazio = desabilitado)
+    AUDIT_DB_PATH = os.getenv("AUDIT_DB_PATH", "data/audit.db")
+    AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", 500))
+    AUDIT_FLUSH_INTERVAL_MS = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", 200))
+    AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", 100000))
+
+    # Modo cluster: cada nó é dono de uma faixa de telefones (hash consistente)
+    # CLUSTER_NODES="node1=http://10.0.0.1:5000,node2=http://10.0.0.2:5000"
+    CLUSTER_NODES = os.getenv("CLUSTER_NODES", "")
+    CLUSTER_NODE_ID = os.getenv("CLUSTER_NODE_ID", "")
+    CLUSTER_SECRET = os.getenv("CLUSTER_SECRET", "")
+    CLUSTER_VNODES = int(os.getenv("CLUSTER_VNODES", 128))
+    CLUSTER_CONNECT_TIMEOUT_MS = int(os.getenv("CLUSTER_CONNECT_TIMEOUT_MS", 500))
+    CLUSTER_FORWARD_TIMEOUT_MS = int(os.getenv("CLUSTER_FORWARD_TIMEOUT_MS", 3000))  # leitura
+
+    # Limite de memória das sessões (acima disso, as menos recentes vão
+    # para o disco em SESSION_SPILL_DIR; vazio = descartadas)
+    SESSION_MAX_RESIDENT = int(os.getenv("SESSION_MAX_RESIDENT", 20000))
+    SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", 64 * 1024 * 1024))
+    SESSION_SPILL_DIR = os.getenv("SESSION_SPILL_DIR", "data/sessions")
+
+    # Cache de frota compartilhado entre sessões
+    FLEET_CACHE_REFRESH_SECONDS = int(os.getenv("FLEET_CACHE_REFRESH_SECONDS", 60))
+    FLEET_CACHE_REFRESH_BATCH = int(os.getenv("FLEET_CACHE_REFRESH_BATCH", 50))
+    FLEET_CACHE_MAX_BACKOFF_SECONDS = int(os.getenv("FLEET_CACHE_MAX_BACKOFF_SECONDS", 900))
+    FLEET_CACHE_IDLE_SECONDS = int(os.getenv("FLEET_CACHE_IDLE_SECONDS", SESSION_TIMEOUT_MINUTES * 60))
+
+    # Busca especulativa da localização ao mostrar as opções do veículo
+    PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "false").lower() == "true"
+    PREFETCH_TTL_SECONDS = int(os.getenv("PREFETCH_TTL_SECONDS", 20))
+    PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", 4))
+
+    # Deduplicação de mensagens entre workers do host (memória compartilhada)
+    DEDUP_SHM_ENABLED = os.getenv("DEDUP_SHM_ENABLED", "true").lower() == "true"
+    DEDUP_SHM_NAME = os.getenv("DEDUP_SHM_NAME", "trackerbot-dedup")
+    DEDUP_TTL_SECONDS = int(os.getenv("DEDUP_TTL_SECONDS", 6 * 3600))
+    # Tamanho: mensagens no pico x TTL, com folga de 4x (ocupação ~25%,
+    # onde um grupo de sonda cheio é improvável), arredondado para potência de 2
+    DEDUP_PEAK_MESSAGES_PER_SECOND = float(os.getenv("DEDUP_PEAK_MESSAGES_PER_SECOND", 3))
+    DEDUP_SLOTS = int(os.getenv(
+        "DEDUP_SLOTS",
+        1 << (max(1, int(DEDUP_PEAK_MESSAGES_PER_SECOND * DEDUP_TTL_SECONDS * 4)) - 1).bit_length()
+    ))
+    DEDUP_GENERATIONS = int(os.getenv("DEDUP_GENERATIONS", 8))
+
+    # Inicialização: aquecimento em segundo plano antes de /ready responder 200
+    WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "false").lower() == "true"
+    SESSION_SNAPSHOT_PATH = os.getenv("SESSION_SNAPSHOT_PATH", "")
+
+    # Taxas (eventos/s) em /stats: janela deslizante em segundos
+    METRICS_WINDOW_SECONDS = int(os.getenv("METRICS_WINDOW_SECONDS", 60))
@@ -3,10 +3,28 @@ from typing import Optional
 from models.entities import Session, Vehicle
 from services.business import business_service
 from clients.whatsapp import whatsapp_client
+from clients.payloads import NAV_BUTTONS, NAV_BUTTONS_MULTI, VEHICLE_BUTTONS, VEHICLE_LIST
 from config.settings import Config
 
 logger = logging.getLogger(__name__)
 
+# Aliases reconhecidos em _handle_vehicle_action (também usados pelo scheduler)
+LOCATION_COMMANDS = ("localizacao", "loc", "l")
+BLOCK_COMMANDS = ("bloquear", "block", "b")
+UNBLOCK_COMMANDS = ("desbloquear", "unblock", "d")
+BACK_COMMANDS = ("voltar", "back")
+MENU_COMMANDS = ("menu",)
+EXIT_COMMANDS = ("sair", "exit", "quit")
+ALERT_ON_COMMANDS = ("alertas", "monitorar")
+ALERT_OFF_COMMANDS = ("alertas off", "desativar alertas")
+FLEET_COMMANDS = ("todos", "frota")
+
+# Limite de caracteres do corpo de mensagem de texto do WhatsApp
+MAX_TEXT_LENGTH = 4096
+
+# Backend de rastreamento fora do ar (não confundir com frota vazia)
+VEHICLES_UNAVAILABLE_TEXT = "Nao foi possivel consultar seus veiculos agora. Tente novamente em instantes."
+
 class MessageHandler:
     """
     Handler de mensagens do chatbot de rastreamento.
@@ -56,7 +74,7 @@ class MessageHandler:
             session.user = user
             session.user.intrudution_shown = False
             session.state = "AUTHENTICATED"
-            logger.info(f"[AUTH] Usuário autenticado: {user.name}, {len(user.vehicles)} veículos")
+            logger.info(f"[AUTH] Usuário autenticado: {user.name}")
             self._show_vehicles(session)
         else:
             # Comandos de autenticação
@@ -69,11 +87,15 @@ class MessageHandler:
                     # Tentar autenticar
                     user = business_service.authenticate_user(identifier, password, "auth/login")
                     
-                    if user and len(user.vehicles) > 0:
+                    vehicles = business_service.get_vehicles(user)
+                    
+                    if user and vehicles is None:
+                        self._send_unavailable(session)
+                    elif user and len(vehicles) > 0:
                         session.user = user
                         session.user.intrudution_shown = False
                         session.state = "AUTHENTICATED"
-                        logger.info(f"[AUTH] Usuário autenticado: {user.name}, {len(user.vehicles)} veículos")
+                        logger.info(f"[AUTH] Usuário autenticado: {user.name}, {len(vehicles)} veículos")
                         self._show_vehicles(session)
                     else:
                         whatsapp_client.send_message(
@@ -102,10 +124,19 @@ class MessageHandler:
         logger.info(f"[AUTH] {session.phone_number} | Tipo: {message_type} | Msg: '{message}'")
         
         # Comando de sair
-        if msg_lower in ["sair", "exit", "quit"]:
+        if msg_lower in EXIT_COMMANDS:
             self._reset_session(session)
             return
         
+        # Resumo de todos os veículos
+        if msg_lower in FLEET_COMMANDS:
+            self._show_fleet_summary(session)
+            return
+        
+        if business_service.get_vehicles(session.user) is None:
+            self._send_unavailable(session)
+            return
+        
         # PASSO 1: Buscar veículo
         vehicle = None
         
@@ -127,7 +158,7 @@ class MessageHandler:
         if vehicle:
             logger.info(f"[AUTH] SELECIONANDO VEICULO: {vehicle.plate} (ID: {vehicle.id})")
             session.state = "VEHICLE_SELECTED"
-            session.selected_vehicle = vehicle
+            session.selected_vehicle_id = vehicle.id
             self._show_vehicle_options(session)
         else:
             logger.warning(f"[AUTH] Veiculo nao encontrado para: '{message}'")
@@ -141,12 +172,16 @@ class MessageHandler:
         """
         Mostra lista de veículos disponíveis.
         
-        CRÍTICO: Limpa selected_vehicle para evitar estado inconsistente
+        CRÍTICO: Limpa selected_vehicle_id para evitar estado inconsistente
         """
         # LIMPAR SELEÇÃO ANTERIOR
-        session.selected_vehicle = None
+        session.selected_vehicle_id = None
+        vehicles = business_service.get_vehicles(session.user)
         
-        if not session.user or not session.user.vehicles:
+        if vehicles is None:
+            self._send_unavailable(session)
+            return
+        if not vehicles:
             whatsapp_client.send_message(
                 session.phone_number,
                 "Nenhum veiculo cadastrado."
@@ -159,10 +194,11 @@ class MessageHandler:
             session.user.intrudution_shown = True
         
         # Se tem apenas 1 veículo, selecionar automaticamente
-        if len(session.user.vehicles) == 1:
-            vehicle = session.user.vehicles[0]
+        if len(vehicles) == 1:
+            vehicle = vehicles[0]
             session.state = "VEHICLE_SELECTED"
-            session.selected_vehicle = vehicle
+            session.selected_vehicle_id = vehicle.id
+            business_service.prefetch_location(vehicle, session)
             
             whatsapp_client.send_interactive_buttons(
                 session.phone_number,
@@ -170,57 +206,39 @@ class MessageHandler:
                 f"Veiculo: {vehicle.plate}\n"
                 f"Modelo: {vehicle.model}\n"
                 f"Status: {'Bloqueado' if vehicle.is_blocked else 'Desbloqueado'}",
-                [
-                    {"id": "localizacao", "title": "Localizacao"},
-                    {"id": "bloquear" if not vehicle.is_blocked else "desbloquear",
-                     "title": "Bloquear" if not vehicle.is_blocked else "Desbloquear"},
-                    {"id": "sair", "title": "Sair"}
-                ]
+                VEHICLE_BUTTONS[(bool(vehicle.is_blocked), False)]
             )
         else:
-            # Múltiplos veículos - mostrar lista
-            sections = [{
-                "title": "Seus Veiculos",
-                "rows": [
-                    {
-                        "id": v.id,  # CRÍTICO: Usar ID, não placa
-                        "title": v.plate,
-                        "description": v.model
-                    } for v in session.user.vehicles
-                ]
-            }]
-            
-            whatsapp_client.send_list(
+            # Múltiplos veículos - mostrar lista (seção "Seus Veiculos" pré-serializada)
+            whatsapp_client.send_list_template(
                 session.phone_number,
                 f"{greeting}Você esta no sistema de Rastreamento!\n\n"
-                f"Selecione um veiculo para ver opcoes:",
-                "Ver Veiculos",
-                sections
+                f"Selecione um veiculo para ver opcoes\n"
+                f"ou envie TODOS para ver a situacao da frota:",
+                VEHICLE_LIST,
+                ((v.id, v.plate, v.model) for v in vehicles)  # CRÍTICO: Usar ID, não placa
             )
     
     def _show_vehicle_options(self, session: Session) -> None:
         """Mostra opções para o veículo selecionado"""
-        vehicle = session.selected_vehicle
+        vehicles = business_service.get_vehicles(session.user)
+        if vehicles is None:
+            self._send_unavailable(session)  # mantém a seleção para a próxima tentativa
+            return
+        vehicle = business_service.get_vehicle(session.user, session.selected_vehicle_id)
         
         if not vehicle:
-            logger.error("[OPTIONS] selected_vehicle é None!")
+            logger.error("[OPTIONS] selected_vehicle_id não encontrado!")
             self._show_vehicles(session)
             return
         
         logger.info(f"[OPTIONS] Mostrando opcoes para: {vehicle.plate}")
         
-        # Definir botões baseado na quantidade de veículos
-        buttons = [
-            {"id": "localizacao", "title": "Localizacao"},
-            {"id": "bloquear" if not vehicle.is_blocked else "desbloquear",
-             "title": "Bloquear" if not vehicle.is_blocked else "Desbloquear"}
-        ]
-        
-        # Adicionar botão Menu se tem múltiplos veículos
-        if len(session.user.vehicles) > 1:
-            buttons.append({"id": "menu", "title": "Menu"})
+        # Definir botões baseado na quantidade de veículos (Menu se tem múltiplos)
+        buttons = VEHICLE_BUTTONS[(bool(vehicle.is_blocked), len(vehicles) > 1)]
         
-        buttons.append({"id": "sair", "title": "Sair"})
+        # Próximo toque quase sempre é "Localizacao": consulta em paralelo ao envio
+        business_service.prefetch_location(vehicle, session)
         
         whatsapp_client.send_interactive_buttons(
             session.phone_number,
@@ -228,6 +246,7 @@ class MessageHandler:
             f"Veiculo: {vehicle.plate}\n"
             f"Modelo: {vehicle.model}\n"
             f"Status: {'Bloqueado' if vehicle.is_blocked else 'Desbloqueado'}\n\n"
+            f"Envie ALERTAS para receber alertas deste veiculo.\n"
             f"Escolha uma opcao:",
             buttons
         )
@@ -236,30 +255,31 @@ class MessageHandler:
         """
         Handler para ações no veículo selecionado.
         
-        IMPORTANTE: Usa session.selected_vehicle para executar ações
+        IMPORTANTE: Usa session.selected_vehicle_id para executar ações
+        (dados lidos do cache de frota, sempre atualizados)
         """
         msg_lower = message.lower().strip()
-        vehicle = session.selected_vehicle
+        vehicles = business_service.get_vehicles(session.user)
+        if vehicles is None:
+            if msg_lower in EXIT_COMMANDS:
+                self._reset_session(session)
+            else:
+                self._send_unavailable(session)  # mantém a seleção para a próxima tentativa
+            return
+        vehicle = business_service.get_vehicle(session.user, session.selected_vehicle_id)
         
         if not vehicle:
-            logger.error(f"[ACTION] selected_vehicle é None! Estado inconsistente.")
+            logger.error(f"[ACTION] selected_vehicle_id não encontrado! Estado inconsistente.")
             self._show_vehicles(session)
             return
         
         logger.info(f"[ACTION] {session.phone_number} | Veiculo: {vehicle.plate} | Acao: '{msg_lower}'")
         
         # Botões de navegação
-        buttons = [
-            {"id": "voltar", "title": "Voltar"}
-        ]
-        
-        if len(session.user.vehicles) > 1:
-            buttons.append({"id": "menu", "title": "Menu"})
-        
-        buttons.append({"id": "sair", "title": "Sair"})
+        buttons = NAV_BUTTONS_MULTI if len(vehicles) > 1 else NAV_BUTTONS
         
         # AÇÃO: Localização
-        if msg_lower in ["localizacao", "loc", "l"]:
+        if msg_lower in LOCATION_COMMANDS:
             logger.info(f"[ACTION] Buscando localizacao para {vehicle.plate}")
             location = business_service.get_vehicle_location(vehicle, session)
             
@@ -281,7 +301,7 @@ class MessageHandler:
                 )
         
         # AÇÃO: Bloquear
-        elif msg_lower in ["bloquear", "block", "b"]:
+        elif msg_lower in BLOCK_COMMANDS:
             logger.info(f"[ACTION] Bloqueando {vehicle.plate}")
             success, message_text = business_service.block_vehicle(vehicle, session)
             whatsapp_client.send_interactive_buttons(
@@ -291,7 +311,7 @@ class MessageHandler:
             )
         
         # AÇÃO: Desbloquear
-        elif msg_lower in ["desbloquear", "unblock", "d"]:
+        elif msg_lower in UNBLOCK_COMMANDS:
             logger.info(f"[ACTION] Desbloqueando {vehicle.plate}")
             success, message_text = business_service.unblock_vehicle(vehicle, session)
             whatsapp_client.send_interactive_buttons(
@@ -300,21 +320,46 @@ class MessageHandler:
                 buttons
             )
         
+        # AÇÃO: Ativar alertas (monitoramento ativo)
+        elif msg_lower in ALERT_ON_COMMANDS:
+            logger.info(f"[ACTION] Ativando alertas para {vehicle.plate}")
+            success, message_text = business_service.subscribe_alerts(vehicle, session)
+            whatsapp_client.send_interactive_buttons(
+                session.phone_number,
+                message_text,
+                buttons
+            )
+        
+        # AÇÃO: Desativar alertas
+        elif msg_lower in ALERT_OFF_COMMANDS:
+            logger.info(f"[ACTION] Desativando alertas para {vehicle.plate}")
+            success, message_text = business_service.unsubscribe_alerts(vehicle, session)
+            whatsapp_client.send_interactive_buttons(
+                session.phone_number,
+                message_text,
+                buttons
+            )
+        
+        # AÇÃO: Resumo de todos os veículos
+        elif msg_lower in FLEET_COMMANDS:
+            logger.info(f"[ACTION] Resumo da frota")
+            self._show_fleet_summary(session)
+        
         # NAVEGAÇÃO: Voltar
-        elif msg_lower in ["voltar", "back"]:
+        elif msg_lower in BACK_COMMANDS:
             logger.info(f"[ACTION] Voltar para opcoes de {vehicle.plate}")
             self._show_vehicle_options(session)
         
         # NAVEGAÇÃO: Menu (voltar para lista de veículos)
-        elif msg_lower in ["menu"]:
+        elif msg_lower in MENU_COMMANDS:
             logger.info(f"[ACTION] Voltando para menu principal")
             # IMPORTANTE: Resetar estado e limpar veículo selecionado
             session.state = "AUTHENTICATED"
-            session.selected_vehicle = None
+            session.selected_vehicle_id = None
             self._show_vehicles(session)
         
         # NAVEGAÇÃO: Sair
-        elif msg_lower in ["sair", "exit", "quit"]:
+        elif msg_lower in EXIT_COMMANDS:
             logger.info(f"[ACTION] Saindo do sistema")
             self._reset_session(session)
         
@@ -323,6 +368,81 @@ class MessageHandler:
             logger.warning(f"[ACTION] Comando nao reconhecido: '{msg_lower}'")
             self._show_vehicle_options(session)
     
+    def _show_fleet_summary(self, session: Session) -> None:
+        """
+        Envia a situação de todos os veículos do usuário.
+        
+        As localizações são buscadas em paralelo e o resumo é dividido
+        no menor número possível de mensagens (limite de MAX_TEXT_LENGTH).
+        """
+        vehicles = business_service.get_vehicles(session.user)
+        if vehicles is None:
+            self._send_unavailable(session)
+            return
+        if not vehicles:
+            whatsapp_client.send_message(
+                session.phone_number,
+                "Nenhum veiculo cadastrado."
+            )
+            return
+        
+        results = business_service.get_fleet_locations(session)
+        
+        counts = {"moving": 0, "parked": 0, "blocked": 0, "unknown": 0}
+        lines = []
+        for vehicle, location in results:
+            if not location:
+                status = "unknown"
+                line = f"{vehicle.plate} - Sem localizacao"
+            else:
+                speed = self._to_speed(location.get("speed"))
+                if vehicle.is_blocked:
+                    status = "blocked"
+                    label = "Bloqueado"
+                elif speed > Config.MONITOR_MOVING_SPEED_KMH:
+                    status = "moving"
+                    label = f"Em movimento ({speed:.0f} km/h)"
+                else:
+                    status = "parked"
+                    label = "Parado"
+                line = f"{vehicle.plate} - {label} | {location.get('last_update')}"
+            counts[status] += 1
+            lines.append(line)
+        
+        header = (
+            f"Frota: {len(results)} veiculos\n"
+            f"Em movimento: {counts['moving']} | Parados: {counts['parked']} | "
+            f"Bloqueados: {counts['blocked']}"
+        )
+        if counts["unknown"]:
+            header += f" | Sem localizacao: {counts['unknown']}"
+        
+        for text in self._pack_lines([header, ""] + lines):
+            whatsapp_client.send_message(session.phone_number, text)
+    
+    @staticmethod
+    def _pack_lines(lines: list, limit: int = MAX_TEXT_LENGTH) -> list:
+        """Agrupa linhas no menor número de mensagens de até `limit` caracteres"""
+        messages = []
+        current = ""
+        for line in lines:
+            line = line[:limit]
+            candidate = f"{current}\n{line}" if current else line
+            if len(candidate) > limit:
+                messages.append(current)
+                candidate = line
+            current = candidate
+        if current:
+            messages.append(current)
+        return messages
+    
+    @staticmethod
+    def _to_speed(value) -> float:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return 0.0
+    
     def _get_vehicle_by_plate(self, session: Session, plate: str) -> Optional[Vehicle]:
         """
         Busca veículo por placa ou modelo.
@@ -334,7 +454,7 @@ class MessageHandler:
         Returns:
             Vehicle ou None se não encontrado
         """
-        for vehicle in session.user.vehicles:
+        for vehicle in business_service.get_vehicles(session.user) or []:
             if vehicle.plate.lower().strip() == plate:
                 return vehicle
             if vehicle.model.lower().strip() == plate:
@@ -356,7 +476,7 @@ class MessageHandler:
         """
         logger.debug(f"[ID_SEARCH] Buscando ID: '{vehicle_id}'")
         
-        for vehicle in session.user.vehicles:
+        for vehicle in business_service.get_vehicles(session.user) or []:
             # Comparação exata de strings
             if str(vehicle.id).strip() == str(vehicle_id).strip():
                 logger.debug(f"[ID_SEARCH] ✓ MATCH: {vehicle.plate} (ID: {vehicle.id})")
@@ -367,6 +487,9 @@ class MessageHandler:
         logger.warning(f"[ID_SEARCH] Nenhum veiculo encontrado com ID: '{vehicle_id}'")
         return None
     
+    def _send_unavailable(self, session: Session) -> None:
+        whatsapp_client.send_message(session.phone_number, VEHICLES_UNAVAILABLE_TEXT)
+    
     def _reset_session(self, session: Session) -> None:
         """
         Reseta a sessão para estado inicial.
@@ -375,9 +498,10 @@ class MessageHandler:
         """
         logger.info(f"[RESET] Resetando sessao de {session.phone_number}")
         
+        business_service.end_alerts(session)
         session.user = None
         session.state = "UNAUTHENTICATED"
-        session.selected_vehicle = None
+        session.selected_vehicle_id = None
         
         whatsapp_client.send_message(
             session.phone_number,
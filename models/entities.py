@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
 
 @dataclass
@@ -15,17 +15,28 @@ class Vehicle:
 @dataclass
 class User:
     name: str
-    vehicles: List[Vehicle] = field(default_factory=list)
-    token: Optional[str] = None
+    token: Optional[str] = None  # veículos ficam no cache de frota, por token
     intrudution_shown: bool = False
 
+@dataclass
+class AlertSubscription:
+    phone_number: str
+    vehicle_id: str
+    plate: str
+    token: str
+    speed_limit: Optional[float] = None
+    geofence_center: Optional[Tuple[float, float]] = None  # (lat, lng)
+    geofence_radius_m: Optional[float] = None
+    geofence_polygon: Optional[List[Tuple[float, float]]] = None  # [(lat, lng), ...]
+    blocked_movement: bool = True
+
 @dataclass
 class Session:
     phone_number: str
     state: str = "UNAUTHENTICATED"
     user: Optional[User] = None
     cpf_input: Optional[str] = None
-    selected_vehicle: Optional[Vehicle] = None
+    selected_vehicle_id: Optional[str] = None
     created_at: datetime = field(default_factory=datetime.now)
     last_activity: datetime = field(default_factory=datetime.now)
     
@@ -0,0 +1,103 @@
+"""
+Benchmark da tabela de deduplicação compartilhada (services/dedup.py).
+
+Cada processo reivindica a mesma lista de IDs em ordem embaralhada,
+simulando reentregas da Meta caindo em workers diferentes. Ao final,
+confere que cada ID foi aceito por exatamente um processo e mostra a
+vazão de claim() com e sem disputa.
+
+Usa um segmento próprio (não interfere nos workers em execução).
+
+Uso:
+    python -m scripts.bench_dedup --processes 4 --messages 200000
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from multiprocessing import shared_memory
+from services.dedup import SharedDedupTable
+
+
+def make_table(name: str, slots: int) -> SharedDedupTable:
+    table = SharedDedupTable()
+    table.enabled = True
+    table.name = name
+    table.buckets = SharedDedupTable.buckets_for(slots)
+    return table
+
+
+def worker(name, slots, ids, seed, start, results):
+    table = make_table(name, slots)
+    assert table.available, "memoria compartilhada indisponivel"
+    ids = list(ids)
+    random.Random(seed).shuffle(ids)
+    start.wait()
+    started_at = time.perf_counter()
+    won = sum(1 for message_id in ids if table.claim(message_id))
+    results.put((won, time.perf_counter() - started_at, table.stats["overflow"]))
+    table._close()
+
+
+def run(name, slots, ids, processes):
+    context = multiprocessing.get_context("fork")
+    start = context.Event()
+    results = context.Queue()
+    children = [
+        context.Process(target=worker, args=(name, slots, ids, seed, start, results))
+        for seed in range(processes)
+    ]
+    for child in children:
+        child.start()
+    time.sleep(0.2)
+    start.set()
+    outcomes = [results.get() for _ in children]
+    for child in children:
+        child.join()
+    return outcomes
+
+
+def cleanup(name):
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+        shm.close()
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+    lock_path = os.path.join(tempfile.gettempdir(), f"{name}.lock")
+    if os.path.exists(lock_path):
+        os.remove(lock_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de claim() na tabela de deduplicação compartilhada")
+    parser.add_argument("--processes", type=int, default=4, help="Processos disputando os mesmos IDs")
+    parser.add_argument("--messages", type=int, default=200000, help="IDs distintos")
+    parser.add_argument("--slots", type=int, default=1 << 20, help="Slots da tabela")
+    args = parser.parse_args()
+
+    ids = [f"wamid.HBgNNTUxMTk{i:012d}FQIAEhgUM0E" for i in range(args.messages)]
+
+    for processes in sorted({1, args.processes}):
+        name = f"trackerbot-dedup-bench-{os.getpid()}-{processes}"
+        try:
+            outcomes = run(name, args.slots, ids, processes)
+        finally:
+            cleanup(name)
+
+        won = sum(w for w, _, _ in outcomes)
+        elapsed = max(e for _, e, _ in outcomes)
+        overflow = sum(o for _, _, o in outcomes)
+        claims = processes * len(ids)
+        print(f"Processos: {processes}")
+        print(f"  claims:            {claims}")
+        print(f"  aceitos:           {won} (esperado {len(ids)}) {'OK' if won == len(ids) else 'FALHOU'}")
+        print(f"  grupo cheio:       {overflow}")
+        print(f"  vazao total:       {claims / elapsed:,.0f} claims/s")
+        print(f"  custo por claim:   {elapsed / len(ids) * 1e6:.2f} us (por processo)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Microbenchmark da serialização das mensagens enviadas (clients/payloads.py).
+
+Compara, para as respostas mais comuns do bot, o caminho anterior
+(listas de botões e dicts montados a cada envio, serializados pelo
+`requests` com json.dumps) com os templates pré-serializados. Antes de
+medir, confere que os dois produzem o mesmo JSON.
+
+Uso:
+    python -m scripts.bench_payloads --iterations 100000
+"""
+import argparse
+import json
+import time
+from clients import payloads
+from clients.payloads import NAV_BUTTONS_MULTI, VEHICLE_BUTTONS, VEHICLE_LIST
+
+TO = "5511999990000"
+VEHICLES = [(f"veh-{i}", f"ABC1D{i:02d}", f"Modelo {i}") for i in range(8)]
+OPTIONS_BODY = (
+    "Você esta no sistema de Rastreamento!\n\n"
+    "Veiculo: ABC1D23\nModelo: Onix\nStatus: Desbloqueado\n\n"
+    "Envie ALERTAS para receber alertas deste veiculo.\nEscolha uma opcao:"
+)
+LIST_BODY = "Olá, João!\nVocê esta no sistema de Rastreamento!\n\nSelecione um veiculo para ver opcoes"
+
+
+def requests_body(payload: dict) -> bytes:
+    """O que `requests` fazia com json=payload"""
+    return json.dumps(payload, allow_nan=False).encode("utf-8")
+
+
+def legacy_buttons(to, body, is_blocked, multiple):
+    buttons = [
+        {"id": "localizacao", "title": "Localizacao"},
+        {"id": "bloquear" if not is_blocked else "desbloquear",
+         "title": "Bloquear" if not is_blocked else "Desbloquear"}
+    ]
+    if multiple:
+        buttons.append({"id": "menu", "title": "Menu"})
+    buttons.append({"id": "sair", "title": "Sair"})
+    button_list = []
+    for i, btn in enumerate(buttons[:3]):
+        button_list.append({
+            "type": "reply",
+            "reply": {"id": btn.get("id", f"btn_{i}"), "title": btn.get("title", f"Opcao {i+1}")[:20]}
+        })
+    return requests_body({
+        "messaging_product": "whatsapp",
+        "to": to,
+        "type": "interactive",
+        "interactive": {"type": "button", "body": {"text": body}, "action": {"buttons": button_list}}
+    })
+
+
+def legacy_nav(to, body):
+    buttons = [{"id": "voltar", "title": "Voltar"}, {"id": "menu", "title": "Menu"}, {"id": "sair", "title": "Sair"}]
+    button_list = [
+        {"type": "reply", "reply": {"id": b["id"], "title": b["title"][:20]}} for b in buttons[:3]
+    ]
+    return requests_body({
+        "messaging_product": "whatsapp",
+        "to": to,
+        "type": "interactive",
+        "interactive": {"type": "button", "body": {"text": body}, "action": {"buttons": button_list}}
+    })
+
+
+def legacy_list(to, body, vehicles):
+    sections = [{
+        "title": "Seus Veiculos",
+        "rows": [{"id": vid, "title": plate, "description": model} for vid, plate, model in vehicles]
+    }]
+    return requests_body({
+        "messaging_product": "whatsapp",
+        "to": to,
+        "type": "interactive",
+        "interactive": {"type": "list", "body": {"text": body}, "action": {"button": "Ver Veiculos", "sections": sections}}
+    })
+
+
+def legacy_text(to, body):
+    return requests_body({"messaging_product": "whatsapp", "to": to, "type": "text", "text": {"body": body}})
+
+
+CASES = {
+    "opcoes do veiculo": (
+        lambda: legacy_buttons(TO, OPTIONS_BODY, False, True),
+        lambda: payloads.buttons_payload(TO, OPTIONS_BODY, VEHICLE_BUTTONS[(False, True)])
+    ),
+    "resultado de acao": (
+        lambda: legacy_nav(TO, "Comando de bloqueio enviado."),
+        lambda: payloads.buttons_payload(TO, "Comando de bloqueio enviado.", NAV_BUTTONS_MULTI)
+    ),
+    "lista de veiculos": (
+        lambda: legacy_list(TO, LIST_BODY, VEHICLES),
+        lambda: VEHICLE_LIST.render(TO, LIST_BODY, VEHICLES)
+    ),
+    "texto": (
+        lambda: legacy_text(TO, "Ate logo!"),
+        lambda: payloads.text_payload(TO, "Ate logo!")
+    )
+}
+
+
+def measure(fn, iterations: int) -> float:
+    """Tempo de CPU por chamada, em microssegundos"""
+    started_at = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - started_at) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU por mensagem: dict + json.dumps vs templates em bytes")
+    parser.add_argument("--iterations", type=int, default=100000, help="Mensagens por caso")
+    args = parser.parse_args()
+
+    for name, (legacy, compiled) in CASES.items():
+        assert json.loads(legacy()) == json.loads(compiled()), f"payload divergente: {name}"
+
+    print(f"{'':20} {'antes (us)':>11} {'depois (us)':>12} {'ganho':>7}")
+    for name, (legacy, compiled) in CASES.items():
+        before = measure(legacy, args.iterations)
+        after = measure(compiled, args.iterations)
+        print(f"{name:20} {before:11.2f} {after:12.2f} {before / after:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
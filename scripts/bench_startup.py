@@ -0,0 +1,95 @@
+"""
+Mede o tempo de inicialização do app.
+
+Para cada rodada, um interpretador novo importa o app e mede:
+- importação de app.py
+- primeira requisição (/health) e a seguinte, para ver o custo
+  do que ficou para o primeiro uso
+- tempo até /ready responder 200 (com WARMUP_ENABLED=true o
+  aquecimento roda em segundo plano após a importação)
+
+Uso:
+    python -m scripts.bench_startup --runs 10
+    WARMUP_ENABLED=true python -m scripts.bench_startup --runs 10
+    python -m scripts.bench_startup --importtime   # módulos mais caros
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+CHILD = r"""
+import json, logging, time
+started_at = time.perf_counter()
+import app
+imported_at = time.perf_counter()
+logging.disable(logging.CRITICAL)
+client = app.app.test_client()
+
+t = time.perf_counter()
+client.get("/health")
+first_request = time.perf_counter() - t
+
+t = time.perf_counter()
+client.get("/health")
+second_request = time.perf_counter() - t
+
+while client.get("/ready").status_code != 200:
+    time.sleep(0.005)
+ready_at = time.perf_counter()
+
+print(json.dumps({
+    "import_ms": (imported_at - started_at) * 1000,
+    "first_request_ms": first_request * 1000,
+    "second_request_ms": second_request * 1000,
+    "ready_ms": (ready_at - started_at) * 1000
+}))
+"""
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de importação, primeira requisição e prontidão do app")
+    parser.add_argument("--runs", type=int, default=10, help="Rodadas (um processo novo por rodada)")
+    parser.add_argument("--importtime", action="store_true", help="Lista os módulos mais caros na importação")
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    if args.importtime:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import app"],
+            cwd=root, capture_output=True, text=True
+        )
+        rows = []
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative_us, name = line[len("import time:"):].split("|")
+            rows.append((int(cumulative_us), name.rstrip()))
+        for cumulative_us, name in sorted(rows, reverse=True)[:15]:
+            print(f"{cumulative_us / 1000:8.1f} ms  {name}")
+        return
+
+    samples = {"import_ms": [], "first_request_ms": [], "second_request_ms": [], "ready_ms": []}
+    for _ in range(args.runs):
+        result = subprocess.run([sys.executable, "-c", CHILD], cwd=root, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(result.stderr, file=sys.stderr)
+            sys.exit(1)
+        for key, value in json.loads(result.stdout.strip().splitlines()[-1]).items():
+            samples[key].append(value)
+
+    print(f"Rodadas: {args.runs} (WARMUP_ENABLED={os.getenv('WARMUP_ENABLED', 'false')})")
+    print(f"{'':20} {'p50':>9} {'p95':>9} {'max':>9}")
+    for key, values in samples.items():
+        print(f"{key:20} {percentile(values, 0.5):8.1f}  {percentile(values, 0.95):8.1f}  {max(values):8.1f}")
+
+
+if __name__ == "__main__":
+    main()
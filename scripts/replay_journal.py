@@ -0,0 +1,97 @@
+"""
+Reproduz um journal de mensagens capturado em produção.
+
+Envia cada mensagem "in" ao MessageOrchestrator respeitando os
+intervalos originais, acelerados pelo multiplicador --speed
+(0 = o mais rápido possível), e mede vazão e latência. Mensagens do
+mesmo telefone vão sempre para o mesmo worker, na ordem do journal,
+como no webhook (a sessão é uma máquina de estados).
+
+ATENÇÃO: as mensagens passam pelo fluxo real. Aponte API_BASE_URL e
+WHATSAPP_API_URL para um ambiente de homologação antes de executar.
+
+Uso:
+    python -m scripts.replay_journal /var/lib/chatbot/journal/journal-*.log --speed 10
+"""
+import argparse
+import logging
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from services.journal import read_journal, pending_records
+from services.orchestrator import orchestrator
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduz um journal de mensagens no orquestrador")
+    parser.add_argument("paths", nargs="+", help="Arquivos de journal")
+    parser.add_argument("--speed", type=float, default=1.0, help="Multiplicador de velocidade (0 = sem espera)")
+    parser.add_argument("--workers", type=int, default=8, help="Workers (cada telefone fica em um só)")
+    parser.add_argument("--pending-only", action="store_true", help="Somente mensagens sem marcador de conclusão")
+    parser.add_argument("--verbose", action="store_true", help="Mostra os logs do chatbot")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    # Os IDs já estão na tabela compartilhada dos workers deste host
+    orchestrator.dedup.enabled = False
+
+    records = []
+    for path in args.paths:
+        if args.pending_only:
+            records.extend(pending_records(read_journal(path)))
+        else:
+            records.extend(r for r in read_journal(path) if r.get("op") == "in")
+    records.sort(key=lambda r: r["ts"])
+
+    if not records:
+        print("Nenhuma mensagem para reproduzir.")
+        return
+
+    latencies = []
+    lags = []
+    lock = threading.Lock()
+
+    def run(record, scheduled_at):
+        started_at = time.monotonic()
+        orchestrator.process_message(record["phone"], record["text"], record["type"], record["id"])
+        with lock:
+            latencies.append(time.monotonic() - started_at)
+            lags.append(started_at - scheduled_at)
+
+    first_ts = records[0]["ts"]
+    replay_started_at = time.monotonic()
+    # Um executor de uma thread por fatia de telefones: ordem preservada por telefone
+    shards = [ThreadPoolExecutor(max_workers=1) for _ in range(max(1, args.workers))]
+    for record in records:
+        offset = (record["ts"] - first_ts) / args.speed if args.speed > 0 else 0.0
+        scheduled_at = replay_started_at + offset
+        delay = scheduled_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        shard = shards[zlib.crc32(str(record["phone"]).encode()) % len(shards)]
+        shard.submit(run, record, scheduled_at)
+    for shard in shards:
+        shard.shutdown(wait=True)
+    elapsed = time.monotonic() - replay_started_at
+
+    print(f"Mensagens:            {len(records)}")
+    print(f"Duracao original:     {records[-1]['ts'] - first_ts:.1f}s")
+    print(f"Duracao da reproducao: {elapsed:.1f}s (speed={args.speed})")
+    print(f"Vazao:                {len(records) / elapsed:.1f} msg/s")
+    print(f"Latencia p50/p95/p99: {percentile(latencies, 0.50) * 1000:.1f} / "
+          f"{percentile(latencies, 0.95) * 1000:.1f} / {percentile(latencies, 0.99) * 1000:.1f} ms")
+    print(f"Latencia maxima:      {max(latencies) * 1000:.1f} ms")
+    print(f"Atraso de fila p95:   {percentile(lags, 0.95) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
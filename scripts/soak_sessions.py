@@ -0,0 +1,398 @@
+"""
+Teste de longa duração (soak) do SessionManager e dos caches.
+
+Simula horas de tráfego em tempo comprimido pelo MessageOrchestrator
+real: telefones novos chegando, conversas (login, seleção de veículo,
+localização, bloqueio, alertas, saída), reentregas da Meta, usuários
+que somem e voltam depois do timeout. O relógio (datetime.now,
+time.time e time.monotonic dos módulos de sessão e cache) é virtual
+e avança a cada mensagem; o backend de rastreamento e a API do
+WhatsApp são simulados em memória (nada sai da máquina).
+
+A cada --sample-minutes simulados mostra memória (tracemalloc e RSS)
+e o tamanho de cada estrutura que deveria ser limitada. No fim compara
+um snapshot do tracemalloc tirado após o aquecimento com o final e
+lista o crescimento por local de alocação. Sai com código 1 se passar
+dos orçamentos de RSS, de memória por sessão ou de crescimento, ou se
+alguma estrutura crescer em todas as últimas --growth-samples amostras
+após o aquecimento (mais que --growth-tolerance e GROWTH_MIN_ITEMS).
+
+Uso:
+    python -m scripts.soak_sessions --hours 6                      # ~2 min reais
+    python -m scripts.soak_sessions --hours 24 --messages-per-minute 1200 --max-rss-mb 400
+    SESSION_MAX_RESIDENT=2000 python -m scripts.soak_sessions --hours 12   # força spill em disco
+"""
+import argparse
+import gc
+import importlib
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+import zlib
+from datetime import datetime, timedelta
+
+# Os módulos do app leem a configuração na importação: são importados
+# em main(), depois de ajustar o ambiente
+
+# Variação mínima (itens) na janela para uma estrutura contar como crescendo;
+# abaixo disso é oscilação das estruturas pequenas (prefetch, comandos)
+GROWTH_MIN_ITEMS = 20
+
+# Campos das amostras que não são estruturas
+MEMORY_FIELDS = ("minute", "traced_mb", "rss_mb", "kb_per_session")
+
+
+class VirtualClock:
+    """Relógio real + deslocamento que o teste avança"""
+
+    def __init__(self):
+        self.offset = 0.0
+
+    def advance(self, seconds: float) -> None:
+        self.offset += seconds
+
+    def time(self) -> float:
+        return time.time() + self.offset
+
+    def monotonic(self) -> float:
+        return time.monotonic() + self.offset
+
+    def datetime_class(self):
+        clock = self
+
+        class VirtualDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime.now(tz) + timedelta(seconds=clock.offset)
+
+        return VirtualDatetime
+
+    def time_module(self):
+        module = types.ModuleType("time")
+        module.__dict__.update(vars(time))
+        module.time = self.time
+        module.monotonic = self.monotonic
+        return module
+
+
+class FakeResponse:
+    def __init__(self, status_code: int = 200, data=None):
+        self.status_code = status_code
+        self._data = data
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeTracker:
+    """
+    Backend de rastreamento em memória.
+
+    O login pelo telefone funciona para 4 de cada 5 números; o token
+    é "tok-<telefone>" e a frota tem de 1 a 4 veículos "<token>-v<i>".
+    """
+
+    def __init__(self, seed: int):
+        self.random = random.Random(seed)
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        if url.endswith("/block"):
+            return FakeResponse(200, {})
+        identifier = str(json["identifier"])
+        if zlib.crc32(identifier.encode()) % 5 == 0:
+            return FakeResponse(401, {})
+        return FakeResponse(200, {"user": {"name": f"Cliente {identifier[-4:]}"}, "access_token": f"tok-{identifier}"})
+
+    def get(self, url, headers=None, timeout=None):
+        token = headers["Authorization"][len("Bearer "):]
+        if url.endswith("/location"):
+            r = self.random
+            return FakeResponse(200, {"location": {
+                "lat": -23.55 + r.uniform(-0.2, 0.2),
+                "lng": -46.63 + r.uniform(-0.2, 0.2),
+                "address": "Rua Simulada, 100" if r.random() < 0.5 else None,
+                "speed": r.choice((0, 0, 12, 48, 95)),
+                "timestamp": "2026-01-01T00:00:00"
+            }})
+        return FakeResponse(200, {"vehicles": [
+            {"id": f"{token}-v{i}", "plate": f"SIM{i}{zlib.crc32(token.encode()) % 1000:03d}",
+             "model": "Modelo", "block": "desbloqueado"}
+            for i in range(1 + zlib.crc32(token.encode()) % 4)
+        ]})
+
+    def head(self, url, timeout=None):
+        return FakeResponse(200)
+
+
+class FakeWhatsApp:
+    def __init__(self):
+        self.sent = 0
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        self.sent += 1
+        return FakeResponse(200)
+
+    def head(self, url, timeout=None):
+        return FakeResponse(200)
+
+
+SCRIPT = (
+    "oi", "{vehicle}", "localizacao", "voltar", "bloquear", "desbloquear",
+    "alertas", "alertas off", "todos", "menu", "{vehicle}", "localizacao", "sair"
+)
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # pico (sem /proc)
+
+
+def tracked_structures(services) -> dict:
+    """Tamanho das estruturas que precisam ficar limitadas"""
+    from services.journal import journal
+    sm = services.session_manager
+    return {
+        "sessions": len(sm.sessions),
+        "spilled": sm.get_active_count() - len(sm.sessions),
+        "processed_ids": sm.get_stats()["total_processed_messages"],
+        "session_sizes": len(sm._sizes),
+        "in_use": len(sm._in_use),
+        "fleets": len(services.fleet_cache._fleets),
+        "fleet_vehicles": len(services.fleet_cache._vehicles),
+        "prefetch_slots": len(services.location_prefetcher._slots),
+        "address_cache": len(services.address_cache.entries),
+        "monitor_subs": len(services.vehicle_monitor.subscriptions),
+        "monitor_blocked": len(services.vehicle_monitor.blocked),
+        "command_records": len(getattr(services.command_guard.store, "_records", ())),
+        "journal_pending": len(journal._pending)
+    }
+
+
+
+def growing_structures(samples: list, warmup_minutes: int, window: int, tolerance: float) -> dict:
+    """
+    Estruturas que cresceram em todas as últimas `window` amostras
+    após o aquecimento (vazamento provável mesmo dentro do orçamento).
+
+    Returns:
+        dict: nome -> valores na janela
+    """
+    rows = [row for row in samples if row["minute"] >= warmup_minutes][-window:]
+    if len(rows) < max(2, window):
+        return {}
+    growing = {}
+    for name in rows[0]:
+        if name in MEMORY_FIELDS:
+            continue
+        values = [row[name] for row in rows]
+        increase = values[-1] - values[0]
+        if (all(b > a for a, b in zip(values, values[1:]))
+                and increase >= GROWTH_MIN_ITEMS and increase > tolerance * values[0]):
+            growing[name] = values
+    return growing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test do SessionManager e caches em tempo comprimido")
+    parser.add_argument("--hours", type=float, default=6, help="Horas simuladas")
+    parser.add_argument("--messages-per-minute", type=int, default=300, help="Mensagens por minuto simulado")
+    parser.add_argument("--active-phones", type=int, default=3000, help="Telefones em conversa ao mesmo tempo")
+    parser.add_argument("--new-phone-ratio", type=float, default=0.15, help="Fração de mensagens de telefones novos")
+    parser.add_argument("--returning-ratio", type=float, default=0.02, help="Fração de telefones antigos que voltam")
+    parser.add_argument("--redelivery-ratio", type=float, default=0.05, help="Fração de reentregas da Meta")
+    parser.add_argument("--sample-minutes", type=int, default=30, help="Intervalo de amostragem (minutos simulados)")
+    parser.add_argument("--warmup-minutes", type=int, default=90, help="Minutos simulados antes do snapshot base")
+    parser.add_argument("--max-rss-mb", type=float, default=512, help="Orçamento de RSS do processo")
+    parser.add_argument("--max-kb-per-session", type=float, default=16, help="Memória alocada pelo tráfego / sessão residente")
+    parser.add_argument("--max-growth-mb", type=float, default=16, help="Crescimento após o aquecimento (tracemalloc)")
+    parser.add_argument("--growth-samples", type=int, default=4, help="Amostras seguidas em alta que indicam vazamento")
+    parser.add_argument("--growth-tolerance", type=float, default=0.10, help="Alta relativa mínima na janela de --growth-samples")
+    parser.add_argument("--top", type=int, default=15, help="Locais de alocação no relatório")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Amostras e resultado em JSON")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="soak-")
+    os.environ.setdefault("SESSION_SPILL_DIR", os.path.join(work_dir, "sessions"))
+    os.environ.setdefault("SCHEDULER_ENABLED", "false")
+    os.environ.setdefault("DEDUP_SHM_ENABLED", "false")  # exercita processed_messages do SessionManager
+    os.environ.setdefault("PREFETCH_ENABLED", "true")
+    os.environ.setdefault("WARMUP_ENABLED", "false")
+    os.environ["AUDIT_DB_PATH"] = ""
+    os.environ["JOURNAL_DIR"] = ""
+    os.environ["ADDRESS_CACHE_PATH"] = ""
+    os.environ.setdefault("ADDRESS_CACHE_MAX_ENTRIES", "2000")  # atinge o limite e exercita o LRU
+    os.environ["SESSION_SNAPSHOT_PATH"] = ""
+    os.environ["COMMAND_STORE_URL"] = ""
+    logging.basicConfig(level=logging.CRITICAL)
+
+    tracemalloc.start()
+    import services
+    from clients.tracker_api import tracker_api
+    from clients.whatsapp import whatsapp_client
+    logging.disable(logging.CRITICAL)
+
+    clock = VirtualClock()
+    virtual_time = clock.time_module()
+    for name in ("services.session_manager", "services.fleet_cache", "services.prefetch",
+                 "services.command_guard", "services.dedup", "services.metrics"):
+        importlib.import_module(name).time = virtual_time
+    importlib.import_module("services.session_manager").datetime = clock.datetime_class()
+    importlib.import_module("models.entities").datetime = clock.datetime_class()
+
+    tracker_api._http._session = FakeTracker(args.seed)
+    whatsapp = FakeWhatsApp()
+    whatsapp_client._http._session = whatsapp
+    orchestrator = services.orchestrator
+
+    rng = random.Random(args.seed)
+    pool = []           # [telefone, passo do roteiro, último message_id]
+    next_phone = 0
+    seq = 0
+    total_minutes = int(args.hours * 60)
+    step_seconds = 60.0 / args.messages_per_minute
+
+    # Alocações do próprio teste (pool, amostras) não entram no relatório
+    own_file = os.path.abspath(__file__)
+    filters = [tracemalloc.Filter(False, own_file), tracemalloc.Filter(False, tracemalloc.__file__)]
+
+    gc.collect()
+    traffic_start = tracemalloc.get_traced_memory()[0]
+    baseline = None
+    samples = []
+    started_at = time.monotonic()
+
+    def new_phone():
+        nonlocal next_phone
+        next_phone += 1
+        return [f"5511{next_phone:09d}", 0, None]
+
+    def sample(minute):
+        # A thread do fleet_cache dorme em tempo real: expira pelo relógio virtual antes de medir
+        services.fleet_cache._expire_idle()
+        gc.collect()
+        traced = tracemalloc.get_traced_memory()[0]
+        structures = tracked_structures(services)
+        row = {
+            "minute": minute,
+            "traced_mb": round(traced / 2**20, 2),
+            "rss_mb": round(rss_bytes() / 2**20, 1),
+            "kb_per_session": round((traced - traffic_start) / 1024 / max(1, structures["sessions"]), 2),
+            **structures
+        }
+        samples.append(row)
+        if not args.json:
+            print(f"[{minute // 60:3d}h{minute % 60:02d}] traced {row['traced_mb']:7.2f} MB  rss {row['rss_mb']:7.1f} MB  "
+                  f"{row['kb_per_session']:6.2f} KB/sessao  " + "  ".join(f"{k}={v}" for k, v in structures.items()))
+        return row
+
+    for minute in range(1, total_minutes + 1):
+        for _ in range(args.messages_per_minute):
+            clock.advance(step_seconds)
+            roll = rng.random()
+            if roll < args.new_phone_ratio or not pool:
+                entry = new_phone()
+                if len(pool) < args.active_phones:
+                    pool.append(entry)
+                else:
+                    pool[rng.randrange(len(pool))] = entry  # quem sai do pool some (sessão expira)
+            elif roll < args.new_phone_ratio + args.returning_ratio:
+                number = rng.randint(1, next_phone)
+                entry = [f"5511{number:09d}", 0, None]
+                pool[rng.randrange(len(pool))] = entry
+            else:
+                entry = pool[rng.randrange(len(pool))]
+
+            phone = entry[0]
+            if entry[2] and rng.random() < args.redelivery_ratio:
+                message_id = entry[2]
+                text = SCRIPT[(entry[1] - 1) % len(SCRIPT)]
+            else:
+                seq += 1
+                message_id = f"wamid.SOAK{seq:012d}"
+                text = SCRIPT[entry[1] % len(SCRIPT)]
+                entry[1] += 1
+                entry[2] = message_id
+            text = text.format(vehicle=f"tok-{phone}-v0")
+            orchestrator.process_message(phone, text, "interactive" if text.startswith("tok-") else "text", message_id)
+
+        if minute % args.sample_minutes == 0 or minute == total_minutes:
+            sample(minute)
+        if baseline is None and minute >= args.warmup_minutes:
+            gc.collect()
+            baseline = tracemalloc.take_snapshot().filter_traces(filters)
+            baseline_traced = tracemalloc.get_traced_memory()[0]
+
+    gc.collect()
+    final = tracemalloc.take_snapshot().filter_traces(filters)
+    final_traced = tracemalloc.get_traced_memory()[0]
+    last = samples[-1]
+    elapsed = time.monotonic() - started_at
+
+    growth = []
+    if baseline is not None:
+        for stat in final.compare_to(baseline, "lineno")[:args.top]:
+            if stat.size_diff <= 0:
+                continue
+            frame = stat.traceback[0]
+            growth.append({
+                "site": f"{os.path.relpath(frame.filename)}:{frame.lineno}",
+                "size_diff_kb": round(stat.size_diff / 1024, 1),
+                "count_diff": stat.count_diff
+            })
+    growth_mb = (final_traced - baseline_traced) / 2**20 if baseline is not None else 0.0
+
+    failures = []
+    if last["rss_mb"] > args.max_rss_mb:
+        failures.append(f"RSS {last['rss_mb']} MB > {args.max_rss_mb} MB")
+    if last["kb_per_session"] > args.max_kb_per_session:
+        failures.append(f"{last['kb_per_session']} KB/sessao > {args.max_kb_per_session} KB")
+    if growth_mb > args.max_growth_mb:
+        failures.append(f"crescimento apos aquecimento {growth_mb:.2f} MB > {args.max_growth_mb} MB")
+    growing = growing_structures(samples, args.warmup_minutes, args.growth_samples, args.growth_tolerance)
+    for name, values in growing.items():
+        failures.append(f"{name} cresce em todas as ultimas {len(values)} amostras: {values}")
+
+    result = {
+        "simulated_hours": args.hours,
+        "messages": seq,
+        "phones": next_phone,
+        "whatsapp_sent": whatsapp.sent,
+        "elapsed_seconds": round(elapsed, 1),
+        "growth_after_warmup_mb": round(growth_mb, 2),
+        "growth_by_site": growth,
+        "growing_structures": growing,
+        "samples": samples,
+        "failures": failures
+    }
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"\n{seq} mensagens de {next_phone} telefones em {args.hours} h simuladas ({elapsed:.0f} s reais)")
+        print(f"Crescimento apos o aquecimento: {growth_mb:.2f} MB (tracemalloc)")
+        for item in growth:
+            print(f"  {item['size_diff_kb']:10.1f} KB  {item['count_diff']:+8d}  {item['site']}")
+        print("FALHOU: " + "; ".join(failures) if failures else "OK: dentro dos orcamentos")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,15 @@
+from services.metrics import Metrics, metrics
 from services.session_manager import SessionManager, session_manager
+from services.monitoring import VehicleMonitor, vehicle_monitor
+from services.address_cache import AddressCache, address_cache
+from services.command_guard import CommandGuard, command_guard
+from services.audit import AuditTrail, audit_trail
+from services.fleet_cache import FleetCache, fleet_cache
+from services.prefetch import LocationPrefetcher, location_prefetcher
+from services.dedup import SharedDedupTable, message_dedup
 from services.business import BusinessService, business_service
 from services.orchestrator import MessageOrchestrator, orchestrator
+from services.scheduler import PriorityScheduler, scheduler
+from services.broadcast import BroadcastService, broadcast_service
+from services.cluster import ClusterRouter, cluster
+from services.startup import Warmup, warmup
@@ -0,0 +1,215 @@
+import atexit
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Custo aproximado de cada entrada no OrderedDict (nó + ponteiros)
+_ENTRY_OVERHEAD_BYTES = 100
+
+
+def geohash_encode(lat: float, lng: float, precision: int = 7) -> str:
+    """
+    Codifica coordenadas em geohash.
+
+    Precisão 7 corresponde a células de ~153m x 153m, suficiente
+    para veículos estacionados resolverem sempre o mesmo endereço.
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bit = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(_GEOHASH_BASE32[value])
+            bit = 0
+            value = 0
+    return "".join(chars)
+
+
+class AddressCache:
+    """
+    Cache de endereços (geocodificação reversa) por célula geohash.
+
+    - Chave: geohash das coordenadas (ADDRESS_CACHE_PRECISION)
+    - Despejo LRU ao passar de ADDRESS_CACHE_MAX_ENTRIES
+    - Persistência opcional em ADDRESS_CACHE_PATH (JSON), gravada na
+      saída do processo e por uma thread em segundo plano depois de
+      ADDRESS_CACHE_SAVE_EVERY alterações (agrupadas por
+      ADDRESS_CACHE_SAVE_DELAY_SECONDS), fora da thread da requisição
+    """
+
+    def __init__(self):
+        self.precision = Config.ADDRESS_CACHE_PRECISION
+        self.max_entries = Config.ADDRESS_CACHE_MAX_ENTRIES
+        self.path = Config.ADDRESS_CACHE_PATH
+        self.save_every = Config.ADDRESS_CACHE_SAVE_EVERY
+        self.save_delay = Config.ADDRESS_CACHE_SAVE_DELAY_SECONDS
+
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # uma gravação por vez
+        self._save_requested = threading.Event()
+        self._saver: Optional[threading.Thread] = None
+        self.entries: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_bytes = 0
+        self._unsaved = 0
+        self._loaded = False
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, lat: float, lng: float) -> Optional[str]:
+        """Retorna o endereço em cache para a célula das coordenadas"""
+        key = geohash_encode(lat, lng, self.precision)
+        with self._lock:
+            self._ensure_loaded()
+            address = self.entries.get(key)
+            if address is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return address
+
+    def put(self, lat: float, lng: float, address: str) -> None:
+        """Armazena o endereço resolvido pelo backend"""
+        key = geohash_encode(lat, lng, self.precision)
+        with self._lock:
+            self._ensure_loaded()
+            if not self._store(key, address):
+                return  # mesmo endereço: nada novo para gravar
+            self._unsaved += 1
+            should_save = self.path and self._unsaved >= self.save_every
+
+        if should_save:
+            self._request_save()
+
+    def _store(self, key: str, address: str) -> bool:
+        """
+        Insere e aplica o limite LRU (chamado com o lock).
+
+        Returns:
+            bool: False se a célula já tinha o mesmo endereço
+        """
+        previous = self.entries.pop(key, None)
+        self.entries[key] = address
+        if previous == address:
+            return False
+        if previous is not None:
+            self._memory_bytes -= self._entry_size(key, previous)
+        self._memory_bytes += self._entry_size(key, address)
+
+        while len(self.entries) > self.max_entries:
+            old_key, old_address = self.entries.popitem(last=False)
+            self._memory_bytes -= self._entry_size(old_key, old_address)
+            self.evictions += 1
+        return True
+
+    @staticmethod
+    def _entry_size(key: str, address: str) -> int:
+        return sys.getsizeof(key) + sys.getsizeof(address) + _ENTRY_OVERHEAD_BYTES
+
+    def _ensure_loaded(self) -> None:
+        """Carrega o arquivo persistido no primeiro acesso (chamado com o lock)"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path:
+            return
+        atexit.register(self.save)
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for key, address in data.items():
+                self._store(key, address)
+            logger.info(f"[GEOCACHE] {len(self.entries)} enderecos carregados de {self.path}")
+        except Exception as e:
+            logger.error(f"[GEOCACHE] Erro ao carregar {self.path}: {e}")
+
+    def load(self) -> None:
+        """Carrega o arquivo persistido agora (aquecimento) em vez do primeiro acesso"""
+        with self._lock:
+            self._ensure_loaded()
+
+    def _request_save(self) -> None:
+        """Acorda a thread de gravação (criada no primeiro pedido do processo)"""
+        if self._saver is None or not self._saver.is_alive():
+            with self._lock:
+                if self._saver is None or not self._saver.is_alive():
+                    self._saver = threading.Thread(target=self._save_loop, name="address-cache-saver", daemon=True)
+                    self._saver.start()
+        self._save_requested.set()
+
+    def _save_loop(self) -> None:
+        while True:
+            self._save_requested.wait()
+            # Agrupa as alterações que chegarem durante o intervalo
+            time.sleep(self.save_delay)
+            self._save_requested.clear()
+            self.save()
+
+    def save(self) -> None:
+        """Grava o cache em disco se houve alteração (escrita atômica via arquivo temporário)"""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._unsaved:
+                    return
+                data = dict(self.entries)
+                unsaved, self._unsaved = self._unsaved, 0
+            tmp_path = None
+            try:
+                fd, tmp_path = tempfile.mkstemp(
+                    prefix=f"{os.path.basename(self.path)}.", suffix=".tmp",
+                    dir=os.path.dirname(os.path.abspath(self.path))
+                )
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logger.error(f"[GEOCACHE] Erro ao salvar {self.path}: {e}")
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                with self._lock:
+                    self._unsaved += unsaved  # tenta de novo na próxima gravação
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "memory_bytes": self._memory_bytes
+        }
+
+# Instância global
+address_cache = AddressCache()
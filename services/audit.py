@@ -0,0 +1,191 @@
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = ("ts", "phone_number", "user_name", "vehicle_id", "plate", "command", "result", "latency_ms")
+
+
+class AuditTrail:
+    """
+    Trilha de auditoria dos comandos enviados aos veículos.
+
+    O registro no caminho da requisição só coloca o evento em uma
+    fila em memória; uma thread de escrita grava em lotes no SQLite
+    (uma transação por lote). Se a fila encher, o evento é descartado
+    e contabilizado em vez de bloquear o atendimento.
+
+    Índices por (vehicle_id, ts) e por ts mantêm as consultas rápidas
+    com milhões de linhas.
+    """
+
+    def __init__(self):
+        self.path = Config.AUDIT_DB_PATH
+        self.batch_size = Config.AUDIT_BATCH_SIZE
+        self.flush_interval = Config.AUDIT_FLUSH_INTERVAL_MS / 1000.0
+
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=Config.AUDIT_QUEUE_SIZE)
+        self._writer: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._local = threading.local()
+        self._flushed = threading.Condition()
+        self._enqueued = 0
+        self._written = 0
+
+        self.stats = {"written": 0, "dropped": 0, "batches": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def record(
+        self,
+        phone_number: str,
+        user_name: Optional[str],
+        vehicle_id: str,
+        plate: str,
+        command: str,
+        result: str,
+        latency_ms: float
+    ) -> None:
+        """Registra um comando (não bloqueia)"""
+        if not self.enabled:
+            return
+        self._ensure_writer()
+        row = (time.time(), phone_number, user_name, vehicle_id, plate, command, result, round(latency_ms, 1))
+        try:
+            self._queue.put_nowait(row)
+            with self._flushed:
+                self._enqueued += 1
+        except queue.Full:
+            self.stats["dropped"] += 1
+            logger.error(f"[AUDIT] Fila cheia - evento descartado: {command} {plate} por {phone_number}")
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _ensure_writer(self) -> None:
+        if self._writer is not None:
+            return
+        with self._start_lock:
+            if self._writer is not None:
+                return
+            conn = self._connect()
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS command_audit ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, "
+                "phone_number TEXT, user_name TEXT, vehicle_id TEXT NOT NULL, plate TEXT, "
+                "command TEXT NOT NULL, result TEXT NOT NULL, latency_ms REAL);"
+                "CREATE INDEX IF NOT EXISTS idx_command_audit_vehicle_ts ON command_audit (vehicle_id, ts);"
+                "CREATE INDEX IF NOT EXISTS idx_command_audit_ts ON command_audit (ts);"
+            )
+            conn.close()
+            self._writer = threading.Thread(target=self._write_loop, name="audit-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.flush)
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        insert = f"INSERT INTO command_audit ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            try:
+                with conn:
+                    conn.executemany(insert, batch)
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"[AUDIT] Erro ao gravar lote de {len(batch)} eventos: {e}")
+            finally:
+                with self._flushed:
+                    self._written += len(batch)
+                    self._flushed.notify_all()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Espera a gravação de tudo que já foi registrado"""
+        if self._writer is None:
+            return True
+        with self._flushed:
+            target = self._enqueued
+            return self._flushed.wait_for(lambda: self._written >= target, timeout=timeout)
+
+    def query(
+        self,
+        vehicle_id: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 100
+    ) -> List[dict]:
+        """
+        Consulta eventos (mais recentes primeiro).
+
+        Args:
+            vehicle_id: Filtra pelo veículo
+            since, until: Intervalo de tempo (epoch)
+            limit: Máximo de eventos retornados
+        """
+        if not self.enabled or not os.path.exists(self.path):
+            return []
+
+        conditions = []
+        params: list = []
+        if vehicle_id:
+            conditions.append("vehicle_id = ?")
+            params.append(vehicle_id)
+        if since is not None:
+            conditions.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("ts < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(limit)
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        rows = conn.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM command_audit {where} ORDER BY ts DESC LIMIT ?", params
+        ).fetchall()
+
+        events = []
+        for row in rows:
+            event = dict(zip(_COLUMNS, row))
+            event["ts"] = datetime.fromtimestamp(event["ts"]).isoformat()
+            events.append(event)
+        return events
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize(),
+            **self.stats
+        }
+
+# Instância global
+audit_trail = AuditTrail()
@@ -0,0 +1,83 @@
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional, Union
+from config.settings import Config
+from clients.whatsapp import whatsapp_client
+
+logger = logging.getLogger(__name__)
+
+class BroadcastService:
+    """
+    Envio de alertas operacionais para muitos usuários.
+
+    Cada envio roda em uma thread própria (job) para não prender o
+    request HTTP; o progresso e o resultado por destinatário ficam
+    disponíveis pelo job_id até serem descartados (mantém os últimos N).
+    """
+
+    def __init__(self):
+        self.client = whatsapp_client
+        self.max_jobs = Config.BROADCAST_MAX_JOBS
+        self.jobs: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(
+        self,
+        recipients: List[Union[str, dict]],
+        template: str,
+        language: Optional[str] = None
+    ) -> str:
+        """
+        Inicia um envio em massa em segundo plano.
+
+        Args:
+            recipients: Telefones ou dicts {"to": telefone, "params": ...}
+            template: Texto da mensagem ou nome do template Meta
+            language: Idioma do template Meta (None para texto livre)
+
+        Returns:
+            str: ID do job para consulta do andamento
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": "running",
+            "total": len(recipients),
+            "completed": 0,
+            "created_at": datetime.now().isoformat(),
+            "summary": None
+        }
+
+        with self._lock:
+            self.jobs[job_id] = job
+            while len(self.jobs) > self.max_jobs:
+                self.jobs.popitem(last=False)
+
+        def on_result(result: dict) -> None:
+            with self._lock:
+                job["completed"] += 1
+
+        def run() -> None:
+            try:
+                summary = self.client.send_bulk(recipients, template, language, on_result=on_result)
+                job["summary"] = summary
+                job["status"] = "done"
+            except Exception as e:
+                logger.error(f"[BROADCAST] Erro no job {job_id}: {e}", exc_info=True)
+                job["status"] = "error"
+
+        threading.Thread(target=run, name=f"broadcast-{job_id[:8]}", daemon=True).start()
+        logger.info(f"[BROADCAST] Job {job_id} iniciado para {len(recipients)} destinatarios")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Retorna o estado do job (None se não existir)"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+# Instância global
+broadcast_service = BroadcastService()
@@ -1,7 +1,17 @@
 import logging
-from typing import Optional, Tuple
-from models.entities import Session, User, Vehicle
+import time
+from typing import List, Optional, Tuple
+from config.settings import Config
+from models.entities import AlertSubscription, Session, User, Vehicle
 from clients.tracker_api import tracker_api
+from services.monitoring import vehicle_monitor
+from services.session_manager import session_manager
+from services.address_cache import address_cache
+from services.command_guard import command_guard, SENT, DUPLICATE, SUPERSEDED, BUSY
+from services.audit import audit_trail
+from services.fleet_cache import fleet_cache
+from services.prefetch import location_prefetcher
+from services.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -9,12 +19,86 @@ class BusinessService:
     
     def __init__(self):
         self.api = tracker_api
+        self.monitor = vehicle_monitor
+        self.address_cache = address_cache
+        self.command_guard = command_guard
+        self.audit = audit_trail
+        self.fleet_cache = fleet_cache
+        self.prefetcher = location_prefetcher
+        
+        # Alertas usam o token da sessão: terminam junto com ela
+        session_manager.add_end_listener(self.monitor.unsubscribe_all)
     
     def authenticate_user(self, cpf: str, password: str, url: str) -> Optional[User]:
-        return self.api.authenticate(cpf, password, url)
+        user = self.api.authenticate(cpf, password, url)
+        metrics.incr("logins" if user else "login_failures")
+        return user
+    
+    def get_vehicles(self, user: Optional[User]) -> Optional[List[Vehicle]]:
+        """
+        Veículos do usuário, lidos do cache de frota compartilhado.
+        
+        Returns:
+            List[Vehicle] ou None se o backend não respondeu
+        """
+        if not user:
+            return []
+        return self.fleet_cache.get_vehicles(user.token)
+    
+    def get_vehicle(self, user: Optional[User], vehicle_id: Optional[str]) -> Optional[Vehicle]:
+        if not user:
+            return None
+        return self.fleet_cache.get_vehicle(user.token, vehicle_id)
     
     def get_vehicle_location(self, vehicle: Vehicle, session: Session) -> Optional[dict]:
-        return self.api.get_vehicle_location(vehicle.id, session.user.token)
+        location = self.prefetcher.take(session.phone_number, vehicle.id, session.user.token)
+        if location is None:
+            location = self.api.get_vehicle_location(vehicle.id, session.user.token)
+        return self._resolve_address(location)
+    
+    def prefetch_location(self, vehicle: Vehicle, session: Session) -> None:
+        """Antecipa a consulta de localização (próxima ação mais provável)"""
+        self.prefetcher.prefetch(session.phone_number, vehicle.id, session.user.token)
+    
+    def _resolve_address(self, location: Optional[dict]) -> Optional[dict]:
+        """
+        Usa o cache de endereços por célula geohash.
+        
+        Endereços devolvidos pelo backend alimentam o cache; quando o
+        backend devolve coordenadas sem endereço, o cache preenche.
+        """
+        if not location:
+            return location
+        
+        lat = location.get("latitude")
+        lng = location.get("longitude")
+        if lat is None or lng is None:
+            return location
+        
+        try:
+            lat, lng = float(lat), float(lng)
+        except (TypeError, ValueError):
+            return location
+        
+        if location.get("address"):
+            self.address_cache.put(lat, lng, location["address"])
+        else:
+            cached = self.address_cache.get(lat, lng)
+            if cached:
+                location["address"] = cached
+        return location
+    
+    def get_fleet_locations(self, session: Session) -> List[Tuple[Vehicle, Optional[dict]]]:
+        """
+        Busca a localização de todos os veículos do usuário em paralelo.
+        
+        A latência total fica próxima de uma única consulta; as consultas
+        usam o pool do tracker_api, que limita a concorrência do processo
+        inteiro a TRACKER_FETCH_CONCURRENCY.
+        """
+        vehicles = self.get_vehicles(session.user) or []
+        locations = self.api.get_vehicle_locations([v.id for v in vehicles], session.user.token)
+        return [(v, self._resolve_address(locations.get(v.id))) for v in vehicles]
     
     def block_vehicle(self, vehicle: Vehicle, session: Session) -> Tuple[bool, str]:
         logger.error(f"!!! BLOQUEANDO VEICULO !!!")
@@ -22,10 +106,20 @@ class BusinessService:
         logger.error(f"ID: {vehicle.id}")
         logger.error(f"Modelo: {vehicle.model}")
         
-        success = self.api.block_vehicle(vehicle.id, session.user.token)
-        if success:
-            vehicle.is_blocked = True
+        outcome = self._execute_command(
+            vehicle, session, "bloquear",
+            lambda: self.api.block_vehicle(vehicle.id, session.user.token)
+        )
+        if outcome == SENT:
+            self.fleet_cache.set_blocked(vehicle.id, True)
+            self.monitor.set_blocked(vehicle.id, True)
             return True, f"Comando de bloqueio enviado com sucesso para o veiculo {vehicle.plate}.\n Aguarde em breve avisaremos o bloqueio."
+        if outcome == DUPLICATE:
+            return True, f"Comando de bloqueio ja enviado para o veiculo {vehicle.plate}.\n Aguarde em breve avisaremos o bloqueio."
+        if outcome == SUPERSEDED:
+            return False, f"Comando de bloqueio substituido por um comando mais recente para o veiculo {vehicle.plate}."
+        if outcome == BUSY:
+            return False, "Outro comando ainda esta em andamento para este veiculo. Tente novamente."
         return False, "Erro ao bloquear veiculo. Tente novamente."
 
     def unblock_vehicle(self, vehicle: Vehicle, session: Session) -> Tuple[bool, str]:
@@ -34,10 +128,76 @@ class BusinessService:
         logger.error(f"ID: {vehicle.id}")
         logger.error(f"Modelo: {vehicle.model}")
         
-        success = self.api.unblock_vehicle(vehicle.id, session.user.token)
-        if success:
-            vehicle.is_blocked = False
+        outcome = self._execute_command(
+            vehicle, session, "desbloquear",
+            lambda: self.api.unblock_vehicle(vehicle.id, session.user.token)
+        )
+        if outcome == SENT:
+            self.fleet_cache.set_blocked(vehicle.id, False)
+            self.monitor.set_blocked(vehicle.id, False)
             return True, f"Comando de desbloqueio enviado com sucesso para o veiculo {vehicle.plate}.\n Aguarde em breve avisaremos o desbloqueio. "
+        if outcome == DUPLICATE:
+            return True, f"Comando de desbloqueio ja enviado para o veiculo {vehicle.plate}.\n Aguarde em breve avisaremos o desbloqueio."
+        if outcome == SUPERSEDED:
+            return False, f"Comando de desbloqueio substituido por um comando mais recente para o veiculo {vehicle.plate}."
+        if outcome == BUSY:
+            return False, "Outro comando ainda esta em andamento para este veiculo. Tente novamente."
         return False, "Erro ao desbloquear veiculo. Tente novamente."
 
+    def _execute_command(self, vehicle: Vehicle, session: Session, command: str, send) -> str:
+        """Envia o comando com idempotência e registra na auditoria"""
+        started_at = time.monotonic()
+        outcome = "error"
+        try:
+            outcome = self.command_guard.execute(vehicle.id, command, send)
+            return outcome
+        finally:
+            self.audit.record(
+                phone_number=session.phone_number,
+                user_name=session.user.name if session.user else None,
+                vehicle_id=vehicle.id,
+                plate=vehicle.plate,
+                command=command,
+                result=outcome,
+                latency_ms=(time.monotonic() - started_at) * 1000
+            )
+    
+    def subscribe_alerts(self, vehicle: Vehicle, session: Session) -> Tuple[bool, str]:
+        """
+        Inscreve o veículo no monitoramento ativo.
+        
+        Cerca virtual circular em torno da posição atual, limite de
+        velocidade padrão e alerta de movimento com veículo bloqueado.
+        """
+        location = self.get_vehicle_location(vehicle, session)
+        center = None
+        if location and location.get("latitude") is not None and location.get("longitude") is not None:
+            center = (float(location["latitude"]), float(location["longitude"]))
+        
+        self.monitor.subscribe(AlertSubscription(
+            phone_number=session.phone_number,
+            vehicle_id=vehicle.id,
+            plate=vehicle.plate,
+            token=session.user.token,
+            speed_limit=Config.MONITOR_DEFAULT_SPEED_LIMIT,
+            geofence_center=center,
+            geofence_radius_m=Config.MONITOR_DEFAULT_GEOFENCE_RADIUS_M if center else None
+        ), is_blocked=vehicle.is_blocked)
+        
+        text = (f"Alertas ativados para o veiculo {vehicle.plate}:\n"
+                f"- Velocidade acima de {Config.MONITOR_DEFAULT_SPEED_LIMIT:.0f} km/h\n"
+                f"- Movimento com o veiculo bloqueado")
+        if center:
+            text += f"\n- Saida da cerca de {Config.MONITOR_DEFAULT_GEOFENCE_RADIUS_M:.0f} m em torno da posicao atual"
+        return True, text
+    
+    def unsubscribe_alerts(self, vehicle: Vehicle, session: Session) -> Tuple[bool, str]:
+        if self.monitor.unsubscribe(session.phone_number, vehicle.id):
+            return True, f"Alertas desativados para o veiculo {vehicle.plate}."
+        return False, f"O veiculo {vehicle.plate} nao tem alertas ativos."
+    
+    def end_alerts(self, session: Session) -> int:
+        """Remove os alertas de todos os veículos do usuário (saída)"""
+        return self.monitor.unsubscribe_all(session.phone_number)
+
 business_service = BusinessService()
\ No newline at end of file
@@ -0,0 +1,178 @@
+import bisect
+import hashlib
+import hmac
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+from config.settings import Config
+from clients.http import LazyHttpSession
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+def parse_nodes(value: str) -> Dict[str, str]:
+    """
+    Lê a lista estática de nós.
+
+    Formato: "node1=http://10.0.0.1:5000,node2=http://10.0.0.2:5000"
+    """
+    nodes = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        node_id, _, url = item.partition("=")
+        if not url:
+            raise ValueError(f"CLUSTER_NODES invalido: '{item}' (esperado id=url)")
+        nodes[node_id.strip()] = url.strip().rstrip("/")
+    return nodes
+
+
+class ForwardFailed(Exception):
+    """O dono pode ter recebido a mensagem: não processar localmente"""
+
+
+class HashRing:
+    """
+    Anel de hash consistente com nós virtuais.
+
+    Cada nó ocupa `vnodes` pontos do anel; ao adicionar um nó,
+    apenas ~1/N das chaves mudam de dono.
+    """
+
+    def __init__(self, node_ids: List[str], vnodes: int = 128):
+        points: List[Tuple[int, str]] = []
+        for node_id in node_ids:
+            for i in range(vnodes):
+                points.append((_hash(f"{node_id}#{i}"), node_id))
+        points.sort()
+        self._hashes = [p[0] for p in points]
+        self._owners = [p[1] for p in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class ClusterRouter:
+    """
+    Roteamento de telefones entre nós (modo cluster).
+
+    Cada nó é dono de uma faixa do anel de hash. Mensagens de um
+    telefone de outro dono são repassadas a ele por HTTP interno
+    (/internal/forward, assinado com CLUSTER_SECRET), de modo que a
+    sessão fique sempre em memória no mesmo nó, sem banco compartilhado.
+
+    Só processa localmente quando não conseguiu conectar ao dono. Se a
+    conexão abriu (timeout de leitura, resposta de erro), o dono pode
+    ter recebido a mensagem: forward() levanta ForwardFailed e o
+    webhook responde 503 para a Meta reenviar (a deduplicação do dono
+    descarta a cópia).
+    """
+
+    def __init__(self):
+        self.node_id = Config.CLUSTER_NODE_ID
+        self.nodes = parse_nodes(Config.CLUSTER_NODES)
+        self.secret = Config.CLUSTER_SECRET
+        self.timeout = (Config.CLUSTER_CONNECT_TIMEOUT_MS / 1000.0, Config.CLUSTER_FORWARD_TIMEOUT_MS / 1000.0)
+        self.ring = HashRing(sorted(self.nodes), Config.CLUSTER_VNODES)
+        self._http = LazyHttpSession()
+
+        self.stats = {"forwarded": 0, "forward_failures": 0, "forward_errors": 0, "received": 0}
+
+        if self.nodes and self.node_id not in self.nodes:
+            logger.error(f"[CLUSTER] CLUSTER_NODE_ID '{self.node_id}' nao esta em CLUSTER_NODES - cluster desabilitado")
+        if len(self.nodes) > 1 and not self.secret:
+            logger.error("[CLUSTER] CLUSTER_SECRET vazio - cluster desabilitado")
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.nodes) > 1 and self.node_id in self.nodes and bool(self.secret)
+
+    def owner(self, phone_number: str) -> Optional[str]:
+        return self.ring.owner(phone_number)
+
+    def is_local(self, phone_number: str) -> bool:
+        return not self.enabled or self.owner(phone_number) == self.node_id
+
+    def sign(self, payload: bytes) -> str:
+        return "sha256=" + hmac.new(self.secret.encode(), payload, hashlib.sha256).hexdigest()
+
+    def verify(self, payload: bytes, signature: str) -> bool:
+        if not self.secret or not signature:
+            return False
+        return hmac.compare_digest(self.sign(payload), signature)
+
+    def forward(self, phone_number: str, text: str, message_type: str, message_id: Optional[str]) -> bool:
+        """
+        Repassa a mensagem ao nó dono do telefone.
+
+        Returns:
+            bool: True se o dono aceitou; False se não foi possível
+                conectar (processar localmente)
+
+        Raises:
+            ForwardFailed: conexão aberta, mas sem confirmação do dono
+        """
+        from requests.exceptions import ConnectionError, ConnectTimeout
+        from urllib3.exceptions import NewConnectionError
+
+        owner = self.owner(phone_number)
+        payload = json.dumps({
+            "phone_number": phone_number,
+            "text": text,
+            "message_type": message_type,
+            "message_id": message_id
+        }).encode()
+
+        try:
+            response = self._http.get().post(
+                f"{self.nodes[owner]}/internal/forward",
+                data=payload,
+                headers={
+                    "Content-Type": "application/json",
+                    "X-Cluster-Node": self.node_id,
+                    "X-Cluster-Signature": self.sign(payload)
+                },
+                timeout=self.timeout
+            )
+        except ConnectionError as e:
+            reason = getattr(e.args[0], "reason", None) if e.args else None
+            if isinstance(e, ConnectTimeout) or isinstance(reason, NewConnectionError):
+                self.stats["forward_failures"] += 1
+                logger.warning(f"[CLUSTER] {owner} inacessivel, processando {phone_number} localmente: {e}")
+                return False
+            self._forward_failed(phone_number, owner, e)
+        except Exception as e:
+            self._forward_failed(phone_number, owner, e)
+
+        if response.status_code >= 300:
+            self._forward_failed(phone_number, owner, f"status {response.status_code}")
+        self.stats["forwarded"] += 1
+        logger.info(f"[CLUSTER] {phone_number} repassado para {owner}")
+        return True
+
+    def _forward_failed(self, phone_number: str, owner: str, error) -> None:
+        self.stats["forward_errors"] += 1
+        raise ForwardFailed(f"Repasse de {phone_number} para {owner} sem confirmacao: {error}")
+
+    def record_received(self) -> None:
+        """Conta uma mensagem repassada por outro nó"""
+        self.stats["received"] += 1
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "node_id": self.node_id,
+            "nodes": len(self.nodes),
+            **self.stats
+        }
+
+# Instância global
+cluster = ClusterRouter()
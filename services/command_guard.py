@@ -0,0 +1,291 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional, Tuple
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+# Resultado de CommandGuard.execute
+SENT = "sent"              # comando enviado ao backend com sucesso
+FAILED = "failed"          # backend recusou / erro de rede
+DUPLICATE = "duplicate"    # mesmo comando já em andamento ou enviado há pouco
+SUPERSEDED = "superseded"  # comando oposto mais recente tomou o lugar
+BUSY = "busy"              # outro comando não terminou dentro do tempo de espera
+
+
+class CommandStore:
+    """
+    Armazenamento do estado de comando por veículo.
+
+    Implementações precisam oferecer leitura com versão e
+    compare-and-set atômico (entre processos, se compartilhado).
+    """
+
+    def get(self, vehicle_id: str) -> Tuple[Optional[dict], int]:
+        """Retorna (registro, versão). Versão 0 = inexistente"""
+        raise NotImplementedError
+
+    def compare_and_set(self, vehicle_id: str, version: int, record: dict) -> bool:
+        """Grava o registro se a versão atual ainda for `version`"""
+        raise NotImplementedError
+
+    def purge(self, older_than: float) -> None:
+        """Remove registros sem atualização desde `older_than` (epoch)"""
+        raise NotImplementedError
+
+
+class MemoryCommandStore(CommandStore):
+    """Estado no próprio processo (um único worker)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records: Dict[str, Tuple[dict, int]] = {}
+
+    def get(self, vehicle_id: str) -> Tuple[Optional[dict], int]:
+        with self._lock:
+            record, version = self._records.get(vehicle_id, (None, 0))
+            return (dict(record) if record else None), version
+
+    def compare_and_set(self, vehicle_id: str, version: int, record: dict) -> bool:
+        with self._lock:
+            if self._records.get(vehicle_id, (None, 0))[1] != version:
+                return False
+            self._records[vehicle_id] = (dict(record), version + 1)
+            return True
+
+    def purge(self, older_than: float) -> None:
+        with self._lock:
+            expired = [vid for vid, (r, _) in self._records.items() if r["updated_at"] < older_than]
+            for vehicle_id in expired:
+                del self._records[vehicle_id]
+
+
+class SqliteCommandStore(CommandStore):
+    """
+    Estado em SQLite, compartilhado entre workers do mesmo host.
+
+    O compare-and-set é um UPDATE condicionado à versão, atômico
+    no SQLite mesmo com vários processos.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS vehicle_commands ("
+            "vehicle_id TEXT PRIMARY KEY, version INTEGER NOT NULL, "
+            "data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def get(self, vehicle_id: str) -> Tuple[Optional[dict], int]:
+        row = self._conn().execute(
+            "SELECT data, version FROM vehicle_commands WHERE vehicle_id = ?", (vehicle_id,)
+        ).fetchone()
+        if not row:
+            return None, 0
+        return json.loads(row[0]), row[1]
+
+    def compare_and_set(self, vehicle_id: str, version: int, record: dict) -> bool:
+        conn = self._conn()
+        data = json.dumps(record)
+        if version == 0:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO vehicle_commands (vehicle_id, version, data, updated_at) VALUES (?, 1, ?, ?)",
+                (vehicle_id, data, record["updated_at"])
+            )
+        else:
+            cursor = conn.execute(
+                "UPDATE vehicle_commands SET version = version + 1, data = ?, updated_at = ? "
+                "WHERE vehicle_id = ? AND version = ?",
+                (data, record["updated_at"], vehicle_id, version)
+            )
+        return cursor.rowcount == 1
+
+    def purge(self, older_than: float) -> None:
+        self._conn().execute("DELETE FROM vehicle_commands WHERE updated_at < ?", (older_than,))
+
+
+def create_command_store(url: str) -> CommandStore:
+    """
+    Cria o store a partir da URL de configuração.
+
+    - "" ou "memory": estado por processo
+    - "sqlite:///caminho/arquivo.db": compartilhado entre processos
+    """
+    if not url or url == "memory":
+        return MemoryCommandStore()
+    if url.startswith("sqlite:///"):
+        return SqliteCommandStore(url[len("sqlite:///"):])
+    raise ValueError(f"COMMAND_STORE_URL invalida: {url}")
+
+
+class CommandGuard:
+    """
+    Idempotência de comandos de bloqueio/desbloqueio por veículo.
+
+    Cada veículo tem um registro de curta duração com:
+    - intent: último comando pedido (e intent_id de quem pediu)
+    - inflight: comando sendo enviado ao backend neste momento
+    - last_sent: último comando enviado com sucesso
+
+    Regras:
+    1. Mesmo comando em andamento, na fila ou enviado há menos de
+       ttl segundos -> DUPLICATE (não envia de novo)
+    2. Comando oposto em andamento -> espera terminar e então envia,
+       preservando a ordem no dispositivo
+    3. Enquanto espera, um pedido mais novo substitui o anterior
+       (o que esperava retorna SUPERSEDED sem enviar)
+    """
+
+    def __init__(self, store: CommandStore):
+        self.store = store
+        self.ttl = Config.COMMAND_IDEMPOTENCY_TTL_SECONDS
+        self.inflight_timeout = Config.COMMAND_INFLIGHT_TIMEOUT_SECONDS
+        self.wait_timeout = Config.COMMAND_WAIT_TIMEOUT_SECONDS
+        self.poll_interval = 0.05
+        self._last_purge = 0.0
+
+    def execute(self, vehicle_id: str, command: str, send: Callable[[], bool]) -> str:
+        """
+        Executa `send` respeitando as regras de idempotência.
+
+        Args:
+            vehicle_id: ID do veículo
+            command: "bloquear" ou "desbloquear"
+            send: Função que envia o comando ao backend
+
+        Returns:
+            str: SENT, FAILED, DUPLICATE, SUPERSEDED ou BUSY
+        """
+        intent_id = uuid.uuid4().hex
+        decision = self._begin(vehicle_id, command, intent_id)
+        if decision == "wait":
+            decision = self._wait_turn(vehicle_id, command, intent_id)
+        if decision != "send":
+            logger.info(f"[COMMAND] {command} para {vehicle_id}: {decision}")
+            return decision
+
+        success = False
+        try:
+            success = send()
+        finally:
+            self._finish(vehicle_id, command, intent_id, success)
+        return SENT if success else FAILED
+
+    def _live(self, record: Optional[dict], now: float) -> Optional[dict]:
+        """Descarta registro expirado e envio travado (worker morreu no meio)"""
+        if not record or now - record["updated_at"] > max(self.ttl, self.inflight_timeout):
+            return None
+        if record.get("inflight") and now - record["inflight_since"] > self.inflight_timeout:
+            record["inflight"] = None
+        if record.get("last_sent") and now - record["last_sent_at"] > self.ttl:
+            record["last_sent"] = None
+        return record
+
+    def _begin(self, vehicle_id: str, command: str, intent_id: str) -> str:
+        while True:
+            now = time.time()
+            raw, version = self.store.get(vehicle_id)
+            record = self._live(raw, now)
+
+            if record and record["inflight"] == command:
+                decision = DUPLICATE
+            elif record and record["intent"] == command and (record["inflight"] or record["last_sent"] == command):
+                # Já na fila atrás do comando oposto, ou enviado há pouco
+                return DUPLICATE
+            else:
+                decision = "send" if not (record and record["inflight"]) else "wait"
+
+            new = dict(record) if record else {
+                "intent": None, "intent_id": None,
+                "inflight": None, "inflight_since": 0.0,
+                "last_sent": None, "last_sent_at": 0.0
+            }
+            new["intent"] = command
+            new["intent_id"] = intent_id
+            new["updated_at"] = now
+            if decision == "send":
+                new["inflight"] = command
+                new["inflight_since"] = now
+
+            if self.store.compare_and_set(vehicle_id, version, new):
+                self._maybe_purge(now)
+                return decision
+
+    def _wait_turn(self, vehicle_id: str, command: str, intent_id: str) -> str:
+        """Espera o comando em andamento terminar; envia se ainda for o mais recente"""
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            now = time.time()
+            raw, version = self.store.get(vehicle_id)
+            record = self._live(raw, now)
+            if not record or record["intent_id"] != intent_id:
+                return SUPERSEDED
+            if record["inflight"]:
+                continue
+            record["inflight"] = command
+            record["inflight_since"] = now
+            record["updated_at"] = now
+            if self.store.compare_and_set(vehicle_id, version, record):
+                return "send"
+
+        self._release_intent(vehicle_id, intent_id)
+        return BUSY
+
+    def _finish(self, vehicle_id: str, command: str, intent_id: str, success: bool) -> None:
+        while True:
+            now = time.time()
+            raw, version = self.store.get(vehicle_id)
+            if not raw:
+                return
+            record = dict(raw)
+            record["inflight"] = None
+            record["updated_at"] = now
+            if success:
+                record["last_sent"] = command
+                record["last_sent_at"] = now
+            elif record["intent_id"] == intent_id:
+                # Falhou: permitir nova tentativa imediata
+                record["intent"] = None
+            if self.store.compare_and_set(vehicle_id, version, record):
+                return
+
+    def _release_intent(self, vehicle_id: str, intent_id: str) -> None:
+        while True:
+            raw, version = self.store.get(vehicle_id)
+            if not raw or raw["intent_id"] != intent_id:
+                return
+            raw["intent"] = None
+            raw["updated_at"] = time.time()
+            if self.store.compare_and_set(vehicle_id, version, raw):
+                return
+
+    def _maybe_purge(self, now: float) -> None:
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        try:
+            self.store.purge(now - max(self.ttl, self.inflight_timeout))
+        except Exception as e:
+            logger.warning(f"[COMMAND] Erro ao limpar registros expirados: {e}")
+
+# Instância global
+command_guard = CommandGuard(create_command_store(Config.COMMAND_STORE_URL))
@@ -0,0 +1,215 @@
+import atexit
+import fcntl
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import List, Optional
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = 0x54424F5444445550  # "TBOTDDUP"
+_HEADER_WORDS = 8            # magic, buckets, bucket_size, generation_seconds, ...
+_BUCKET_SIZE = 8             # slots por bucket (2 palavras de 8 bytes cada)
+_PROBE_BUCKETS = 4           # buckets vizinhos sondados (um grupo, sob a mesma faixa)
+_STRIPES = 1024
+_UNPACK_U64 = struct.Struct("<Q").unpack
+
+
+def fingerprint(message_id: str) -> int:
+    """Impressão digital de 64 bits (nunca zero: zero = slot vazio)"""
+    return _UNPACK_U64(hashlib.blake2b(message_id.encode(), digest_size=8).digest())[0] or 1
+
+
+class SharedDedupTable:
+    """
+    Tabela de deduplicação de message_id compartilhada entre os workers
+    do host (multiprocessing.shared_memory).
+
+    Layout: tabela de endereçamento aberto em buckets de 8 slots; cada
+    slot guarda (impressão digital, geração). A impressão digital
+    escolhe o bucket e a sonda percorre, a partir dele, os 4 buckets
+    do seu grupo (32 slots).
+
+    Envelhecimento em anel: o tempo é dividido em DEDUP_GENERATIONS
+    gerações de DEDUP_TTL_SECONDS / DEDUP_GENERATIONS; um slot de
+    geração mais antiga que a janela conta como vazio e é reutilizado
+    sem varredura. Um slot ainda válido nunca é substituído: com o
+    grupo cheio, claim() devolve None e quem chama usa a deduplicação
+    por worker (contado em "overflow"; DEDUP_SLOTS dimensionado para
+    que isso não aconteça).
+
+    claim() é atômico entre processos: cada grupo pertence a uma de
+    1024 faixas protegidas por um lock de byte (fcntl.lockf) num
+    arquivo compartilhado e por um threading.Lock dentro do processo
+    (locks fcntl são por processo, não por thread). O segmento
+    sobrevive a reinícios dos workers; as entradas apenas envelhecem.
+    """
+
+    def __init__(self):
+        self.enabled = Config.DEDUP_SHM_ENABLED
+        self.name = Config.DEDUP_SHM_NAME
+        self.buckets = self.buckets_for(Config.DEDUP_SLOTS)
+        self.generations = Config.DEDUP_GENERATIONS
+        self.generation_seconds = max(1, Config.DEDUP_TTL_SECONDS // self.generations)
+
+        self._pid: Optional[int] = None
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._table = None
+        self._lock_fd: Optional[int] = None
+        self._locks: List[threading.Lock] = []
+        self._init_lock = threading.Lock()
+        self._failed = False
+
+        self.stats = {"claimed": 0, "duplicates": 0, "overflow": 0, "released": 0}
+
+    @staticmethod
+    def buckets_for(slots: int) -> int:
+        """Número de buckets para `slots` (múltiplo do grupo de sonda)"""
+        groups = max(1, -(-slots // (_BUCKET_SIZE * _PROBE_BUCKETS)))
+        return groups * _PROBE_BUCKETS
+
+    @property
+    def available(self) -> bool:
+        return self.enabled and not self._failed and self._attach()
+
+    def _attach(self) -> bool:
+        """Cria ou abre o segmento no processo atual (também após fork)"""
+        if self._pid == os.getpid():
+            return True
+        with self._init_lock:
+            if self._pid == os.getpid():
+                return True
+            try:
+                self._open()
+            except Exception as e:
+                self._failed = True
+                logger.error(f"[DEDUP] Memoria compartilhada indisponivel, usando deduplicacao por worker: {e}")
+                return False
+            self._pid = os.getpid()
+            return True
+
+    def _open(self) -> None:
+        size = (_HEADER_WORDS + self.buckets * _BUCKET_SIZE * 2) * 8
+        lock_path = os.path.join(tempfile.gettempdir(), f"{self.name}.lock")
+        self._lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._locks = [threading.Lock() for _ in range(_STRIPES)]
+
+        # Faixa extra (após as dos buckets) serializa a criação do segmento
+        fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, _STRIPES)
+        try:
+            try:
+                shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+                created = True
+            except FileExistsError:
+                shm = shared_memory.SharedMemory(name=self.name)
+                created = False
+            # O segmento é do host, não deste processo: não remover ao sair
+            resource_tracker.unregister(shm._name, "shared_memory")
+
+            table = shm.buf.cast("Q")
+            if created:
+                table[1] = self.buckets
+                table[2] = _BUCKET_SIZE
+                table[3] = self.generation_seconds
+                table[0] = _MAGIC
+            elif table[0] != _MAGIC or table[1] != self.buckets or table[2] != _BUCKET_SIZE:
+                table.release()
+                shm.close()
+                raise RuntimeError(f"segmento '{self.name}' com formato diferente (remova /dev/shm/{self.name})")
+        finally:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, _STRIPES)
+
+        self._shm = shm
+        self._table = table
+        atexit.register(self._close)
+        logger.info(f"[DEDUP] Tabela compartilhada '{self.name}' {'criada' if created else 'aberta'} "
+                    f"({self.buckets * _BUCKET_SIZE} slots, {size // 1024} KB)")
+
+    def _group(self, message_id: str):
+        """(impressão digital, faixa, primeira palavra do grupo, posição do bucket no grupo)"""
+        fp = fingerprint(message_id)
+        bucket = fp % self.buckets
+        group = bucket // _PROBE_BUCKETS
+        base = _HEADER_WORDS + group * _PROBE_BUCKETS * _BUCKET_SIZE * 2
+        return fp, group % _STRIPES, base, (bucket % _PROBE_BUCKETS) * _BUCKET_SIZE * 2
+
+    def claim(self, message_id: str) -> Optional[bool]:
+        """
+        Reivindica o message_id para este worker.
+
+        Returns:
+            Optional[bool]: True se é a primeira vez (processar); False se
+            duplicada; None se o grupo está cheio de entradas válidas
+            (nada foi gravado: usar a deduplicação por worker)
+        """
+        fp, stripe, base, home = self._group(message_id)
+        words = _PROBE_BUCKETS * _BUCKET_SIZE * 2
+        generation = int(time.time()) // self.generation_seconds
+        oldest = generation - self.generations + 1
+        table = self._table
+
+        with self._locks[stripe]:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, stripe)
+            try:
+                # Uma leitura do grupo inteiro é mais barata que 64 acessos
+                slots = table[base:base + words].tolist()
+                free = -1
+                for offset in range(0, words, 2):
+                    i = (home + offset) % words
+                    if slots[i + 1] >= oldest:
+                        if slots[i] == fp:
+                            self.stats["duplicates"] += 1
+                            return False
+                    elif free < 0:
+                        free = i
+                if free < 0:
+                    self.stats["overflow"] += 1
+                    return None
+                table[base + free] = fp
+                table[base + free + 1] = generation
+            finally:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, stripe)
+        self.stats["claimed"] += 1
+        return True
+
+    def release(self, message_id: str) -> None:
+        """Libera o message_id (reprocessamento de mensagem de worker morto)"""
+        if not self.available:
+            return
+        fp, stripe, base, _ = self._group(message_id)
+        table = self._table
+
+        with self._locks[stripe]:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, stripe)
+            try:
+                for word in range(base, base + _PROBE_BUCKETS * _BUCKET_SIZE * 2, 2):
+                    if table[word] == fp:
+                        table[word] = 0
+                        table[word + 1] = 0
+                        self.stats["released"] += 1
+            finally:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, stripe)
+
+    def _close(self) -> None:
+        if self._table is not None and self._pid == os.getpid():
+            self._table.release()
+            self._shm.close()
+            self._table = None
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "shared": self._pid == os.getpid() and not self._failed,
+            "slots": self.buckets * _BUCKET_SIZE,
+            "window_seconds": self.generation_seconds * self.generations,
+            **self.stats
+        }
+
+# Instância global
+message_dedup = SharedDedupTable()
@@ -0,0 +1,219 @@
+import dataclasses
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+from config.settings import Config
+from models.entities import Vehicle
+from clients.tracker_api import tracker_api
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class _Fleet:
+    vehicle_ids: List[str]
+    fetched_at: float
+    last_read: float
+    failures: int = 0  # falhas seguidas ao reconsultar
+    retry_at: float = 0.0  # próxima tentativa após falha
+
+
+class FleetCache:
+    """
+    Cache de veículos compartilhado entre sessões.
+
+    As sessões guardam só identidade e token; os dados dos veículos
+    ficam aqui, uma única cópia por ID, e a lista de veículos de cada
+    token é carregada sob demanda.
+
+    Cada alteração de um veículo (vinda do backend ou de um comando
+    de bloqueio) incrementa a versão global e a do veículo. Os objetos
+    Vehicle nunca são alterados: uma alteração substitui o objeto.
+
+    Uma thread em segundo plano reconsulta as frotas mais antigas
+    (até FLEET_CACHE_REFRESH_BATCH por ciclo) e aplica apenas as
+    diferenças. Uma frota cuja consulta falha espera (intervalo
+    dobrando a cada falha, até FLEET_CACHE_MAX_BACKOFF_SECONDS) antes
+    de voltar à fila, para não ocupar o lote das demais; token
+    recusado (401) descarta a frota. Frotas sem leitura por
+    FLEET_CACHE_IDLE_SECONDS são descartadas junto com os veículos
+    que só elas referenciavam.
+    """
+
+    def __init__(self, api=tracker_api):
+        self.api = api
+        self.refresh_interval = Config.FLEET_CACHE_REFRESH_SECONDS
+        self.idle_ttl = Config.FLEET_CACHE_IDLE_SECONDS
+        self.refresh_batch = Config.FLEET_CACHE_REFRESH_BATCH
+        self.max_backoff = Config.FLEET_CACHE_MAX_BACKOFF_SECONDS
+
+        self._lock = threading.Lock()
+        self._vehicles: Dict[str, Vehicle] = {}
+        self._versions: Dict[str, int] = {}
+        self._fleets: Dict[str, _Fleet] = {}  # token -> frota
+        self._refresher: Optional[threading.Thread] = None
+        self.version = 0
+
+        self.stats = {"hits": 0, "loads": 0, "refreshes": 0, "changes": 0, "errors": 0, "rejected": 0, "expired": 0}
+
+    def get_vehicles(self, token: str) -> Optional[List[Vehicle]]:
+        """
+        Veículos do token (carrega do backend na primeira leitura).
+
+        Returns:
+            List[Vehicle] ou None se a carga falhou (diferente de frota vazia)
+        """
+        if not token:
+            return []
+        with self._lock:
+            fleet = self._fleets.get(token)
+            if fleet:
+                fleet.last_read = time.time()
+                self.stats["hits"] += 1
+                return [self._vehicles[vid] for vid in fleet.vehicle_ids if vid in self._vehicles]
+
+        if not self.refresh(token):
+            return None
+        self.stats["loads"] += 1
+        with self._lock:
+            fleet = self._fleets[token]
+            return [self._vehicles[vid] for vid in fleet.vehicle_ids if vid in self._vehicles]
+
+    def get_vehicle(self, token: str, vehicle_id: Optional[str]) -> Optional[Vehicle]:
+        """Veículo pelo ID, se pertencer à frota do token"""
+        if not vehicle_id:
+            return None
+        for vehicle in self.get_vehicles(token) or []:
+            if str(vehicle.id) == str(vehicle_id):
+                return vehicle
+        return None
+
+    def get_version(self, vehicle_id: str) -> int:
+        with self._lock:
+            return self._versions.get(vehicle_id, 0)
+
+    def set_blocked(self, vehicle_id: str, is_blocked: bool) -> None:
+        """Atualiza o estado de bloqueio para todas as sessões"""
+        with self._lock:
+            vehicle = self._vehicles.get(vehicle_id)
+            if vehicle and vehicle.is_blocked != is_blocked:
+                self._store(dataclasses.replace(
+                    vehicle, is_blocked=is_blocked, blocked="bloqueado" if is_blocked else "desbloqueado"
+                ))
+
+    def refresh(self, token: str) -> bool:
+        """
+        Reconsulta a frota do token e aplica as diferenças.
+
+        Returns:
+            bool: False se a consulta ao backend falhou
+        """
+        vehicles, status = self.api.fetch_vehicles(token)
+        now = time.time()
+        if vehicles is None:
+            self._refresh_failed(token, status, now)
+            return False
+
+        with self._lock:
+            for vehicle in vehicles:
+                current = self._vehicles.get(vehicle.id)
+                if current is None or not self._same(current, vehicle):
+                    self._store(vehicle)
+            fleet = self._fleets.get(token)
+            ids = [v.id for v in vehicles]
+            if fleet:
+                fleet.vehicle_ids = ids
+                fleet.fetched_at = now
+                fleet.failures = 0
+            else:
+                self._fleets[token] = _Fleet(vehicle_ids=ids, fetched_at=now, last_read=now)
+            self.stats["refreshes"] += 1
+        self._ensure_refresher()
+        return True
+
+    def _refresh_failed(self, token: str, status: Optional[int], now: float) -> None:
+        """Adia a próxima tentativa da frota ou a descarta se o token foi recusado"""
+        with self._lock:
+            self.stats["errors"] += 1
+            fleet = self._fleets.get(token)
+            if fleet is None:
+                return
+            if status == 401:
+                self.stats["rejected"] += 1
+                self._drop([token])
+                return
+            fleet.failures += 1
+            fleet.retry_at = now + min(self.refresh_interval * 2 ** (fleet.failures - 1), self.max_backoff)
+
+    @staticmethod
+    def _same(a: Vehicle, b: Vehicle) -> bool:
+        return (a.plate, a.model, a.status, a.is_blocked, a.blocked) == (b.plate, b.model, b.status, b.is_blocked, b.blocked)
+
+    def _store(self, vehicle: Vehicle) -> None:
+        """Grava nova versão do veículo (chamado com o lock)"""
+        self.version += 1
+        self._vehicles[vehicle.id] = vehicle
+        self._versions[vehicle.id] = self.version
+        self.stats["changes"] += 1
+
+    def _ensure_refresher(self) -> None:
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        with self._lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, name="fleet-cache", daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self) -> None:
+        while True:
+            time.sleep(min(self.refresh_interval, 5))
+            try:
+                self._expire_idle()
+                for token in self._due_tokens():
+                    self.refresh(token)
+            except Exception as e:
+                logger.error(f"[FLEET] Erro ao atualizar frotas: {e}")
+
+    def _due_tokens(self) -> List[str]:
+        """Frotas com dados mais antigos que o intervalo, mais antigas primeiro (exceto as em espera após falha)"""
+        now = time.time()
+        cutoff = now - self.refresh_interval
+        with self._lock:
+            due = [
+                (f.fetched_at, token) for token, f in self._fleets.items()
+                if f.fetched_at < cutoff and f.retry_at <= now
+            ]
+        due.sort()
+        return [token for _, token in due[:self.refresh_batch]]
+
+    def _expire_idle(self) -> None:
+        cutoff = time.time() - self.idle_ttl
+        with self._lock:
+            idle = [token for token, f in self._fleets.items() if f.last_read < cutoff]
+            if not idle:
+                return
+            self._drop(idle)
+            self.stats["expired"] += len(idle)
+
+    def _drop(self, tokens: List[str]) -> None:
+        """Descarta as frotas e os veículos que só elas referenciavam (chamado com o lock)"""
+        for token in tokens:
+            del self._fleets[token]
+        referenced = {vid for f in self._fleets.values() for vid in f.vehicle_ids}
+        for vehicle_id in [vid for vid in self._vehicles if vid not in referenced]:
+            del self._vehicles[vehicle_id]
+            self._versions.pop(vehicle_id, None)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "fleets": len(self._fleets),
+                "vehicles": len(self._vehicles),
+                "version": self.version,
+                **self.stats
+            }
+
+# Instância global
+fleet_cache = FleetCache()
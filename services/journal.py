@@ -0,0 +1,272 @@
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+_SEGMENT_RE = re.compile(r"(journal-(\d+)-([0-9a-f]+)-(\d+)\.log)(?:\.recover-(\d+))?$")
+
+
+def read_journal(path: str) -> Iterator[dict]:
+    """Lê os registros de um arquivo de journal (ignora linha final truncada)"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.warning(f"[JOURNAL] Linha invalida ignorada em {path}")
+
+
+def pending_records(records: Iterator[dict]) -> List[dict]:
+    """Retorna as mensagens recebidas sem marcador de conclusão, em ordem"""
+    pending: Dict[str, dict] = {}
+    for record in records:
+        if record.get("op") == "in":
+            pending[record["id"]] = record
+        elif record.get("op") == "done":
+            pending.pop(record.get("id"), None)
+    return list(pending.values())
+
+
+class MessageJournal:
+    """
+    Journal append-only das mensagens recebidas.
+
+    Fluxo:
+    1. Webhook grava {"op": "in", ...} e só segue após o fsync
+    2. Orquestrador grava {"op": "done", ...} ao terminar (sem esperar)
+    3. Na inicialização, mensagens sem "done" de processos mortos
+       são reprocessadas
+
+    fsync em grupo: o primeiro escritor que precisa de durabilidade
+    faz o fsync de tudo que já foi escrito; os demais esperam por ele.
+    Os marcadores "done" pegam carona nesse fsync ou no flush periódico.
+
+    Cada processo escreve seus próprios segmentos
+    (journal-<pid>-<instancia>-<n>.log), rotacionados ao passar de
+    JOURNAL_MAX_BYTES levando apenas as mensagens em andamento.
+    """
+
+    def __init__(self):
+        self.directory = Config.JOURNAL_DIR
+        self.max_bytes = Config.JOURNAL_MAX_BYTES
+        self.flush_interval = Config.JOURNAL_FLUSH_INTERVAL_MS / 1000.0
+
+        self._cond = threading.Condition()
+        self._file = None
+        self._path: Optional[str] = None
+        self._pid: Optional[int] = None
+        self._instance = ""
+        self._segment = 0
+        self._base_size = 0  # tamanho do segmento logo após a rotação
+        self._written_seq = 0
+        self._synced_seq = 0
+        self._syncing = False
+        self._pending: Dict[str, dict] = {}  # id -> registro "in" em andamento
+        self._flusher: Optional[threading.Thread] = None
+
+        self.stats = {"records": 0, "fsyncs": 0, "rotations": 0, "replayed": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def record_inbound(self, phone_number: str, message_id: str, message_type: str, text: str) -> None:
+        """Grava a mensagem recebida e espera o fsync"""
+        if not self.enabled or not message_id or message_id in self._pending:
+            return  # reentrega de mensagem ainda em andamento já está no journal
+        record = {
+            "op": "in",
+            "id": message_id,
+            "phone": phone_number,
+            "type": message_type,
+            "text": text,
+            "ts": time.time()
+        }
+        with self._cond:
+            seq = self._append(record)
+            self._pending[message_id] = record
+        self._sync(seq)
+
+    def record_done(self, message_id: str) -> None:
+        """Grava o marcador de conclusão (durável no próximo fsync)"""
+        if not self.enabled or not message_id:
+            return
+        with self._cond:
+            if self._file is None or message_id not in self._pending:
+                return
+            self._append({"op": "done", "id": message_id, "ts": time.time()})
+            self._pending.pop(message_id, None)
+            size = self._file.tell()
+            if size > self.max_bytes and size > 2 * self._base_size:
+                self._rotate()
+
+    def _open(self) -> None:
+        """Abre o segmento do processo atual (chamado com o lock)"""
+        pid = os.getpid()
+        if self._file is not None and self._pid == pid:
+            return
+        # Após fork o processo filho precisa de seus próprios segmentos
+        os.makedirs(self.directory, exist_ok=True)
+        self._pid = pid
+        self._instance = f"{time.time_ns():x}"
+        self._segment = 0
+        self._base_size = 0
+        self._written_seq = 0
+        self._synced_seq = 0
+        self._syncing = False
+        self._pending = {}
+        self._path = self._segment_path(self._segment)
+        self._file = open(self._path, "a", encoding="utf-8")
+        self._flusher = threading.Thread(target=self._flush_loop, name="journal-flusher", daemon=True)
+        self._flusher.start()
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"journal-{self._pid}-{self._instance}-{segment}.log")
+
+    def _append(self, record: dict) -> int:
+        """Escreve o registro no buffer do arquivo (chamado com o lock)"""
+        self._open()
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._written_seq += 1
+        self.stats["records"] += 1
+        return self._written_seq
+
+    def _sync(self, seq: int) -> None:
+        """Garante que o registro `seq` foi para o disco (fsync em grupo)"""
+        with self._cond:
+            while self._synced_seq < seq:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                self._syncing = True
+                target = self._written_seq
+                self._file.flush()
+                fd = self._file.fileno()
+                self._cond.release()
+                try:
+                    os.fsync(fd)
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                self._synced_seq = max(self._synced_seq, target)
+                self.stats["fsyncs"] += 1
+                self._cond.notify_all()
+
+    def _flush_loop(self) -> None:
+        """Torna duráveis os marcadores "done" pendentes periodicamente"""
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                with self._cond:
+                    if self._file is None or self._pid != os.getpid():
+                        return
+                    seq = self._written_seq
+                if seq > self._synced_seq:
+                    self._sync(seq)
+            except Exception as e:
+                logger.error(f"[JOURNAL] Erro no flush periodico: {e}")
+
+    def _rotate(self) -> None:
+        """
+        Abre um novo segmento só com as mensagens em andamento
+        e remove o anterior (chamado com o lock).
+        """
+        while self._syncing:
+            self._cond.wait()
+        old_file, old_path = self._file, self._path
+        self._segment += 1
+        self._path = self._segment_path(self._segment)
+        self._file = open(self._path, "a", encoding="utf-8")
+        for record in self._pending.values():
+            self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._synced_seq = self._written_seq
+        self._base_size = self._file.tell()
+        old_file.close()
+        os.remove(old_path)
+        self.stats["rotations"] += 1
+        logger.info(f"[JOURNAL] Segmento rotacionado: {self._path} ({len(self._pending)} em andamento)")
+
+    def recover(self, processor: Callable[[str, str, str, Optional[str]], None]) -> int:
+        """
+        Reprocessa mensagens inacabadas de processos que não existem mais.
+
+        Cada segmento órfão é reivindicado com rename atômico (só um
+        worker o reprocessa), as mensagens pendentes são regravadas no
+        journal deste processo e então entregues ao `processor`.
+
+        Returns:
+            int: Número de mensagens reprocessadas
+        """
+        if not self.enabled or not os.path.isdir(self.directory):
+            return 0
+
+        replayed = 0
+        for path in sorted(glob.glob(os.path.join(self.directory, "journal-*"))):
+            match = _SEGMENT_RE.search(path)
+            if not match:
+                continue
+            base, pid, instance, _, recovering_pid = match.groups()
+            if recovering_pid:
+                # Worker que estava reprocessando morreu antes de terminar
+                if _pid_alive(int(recovering_pid)):
+                    continue
+            elif not self._is_orphan(int(pid), instance):
+                continue
+
+            claimed = os.path.join(self.directory, f"{base}.recover-{os.getpid()}")
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue  # outro worker reivindicou primeiro
+
+            pending = pending_records(read_journal(claimed))
+            for record in pending:
+                self.record_inbound(record["phone"], record["id"], record["type"], record["text"])
+            os.remove(claimed)
+
+            for record in pending:
+                logger.info(f"[JOURNAL] Reprocessando {record['id'][:20]}... de {record['phone']}")
+                processor(record["phone"], record["text"], record["type"], record["id"])
+                replayed += 1
+
+        self.stats["replayed"] += replayed
+        if replayed:
+            logger.info(f"[JOURNAL] {replayed} mensagens reprocessadas")
+        return replayed
+
+    def _is_orphan(self, pid: int, instance: str) -> bool:
+        """Segmento de processo morto (ou de execução anterior com o mesmo PID)"""
+        if pid == os.getpid():
+            return not (self._pid == pid and instance == self._instance)
+        return not _pid_alive(pid)
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._pending),
+            **self.stats
+        }
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+# Instância global
+journal = MessageJournal()
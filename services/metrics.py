@@ -0,0 +1,87 @@
+import threading
+import time
+from typing import Dict
+from config.settings import Config
+
+
+class RollingRate:
+    """
+    Contador com taxa por segundo numa janela deslizante.
+
+    Anel de baldes de 1 segundo com a soma da janela mantida a cada
+    evento: add() e rate() custam O(1) amortizado (só os baldes que
+    saíram da janela são zerados), independente do volume.
+    """
+
+    def __init__(self, window_seconds: int = 60):
+        self.window = max(1, window_seconds)
+        self.total = 0  # desde o início do processo
+        self._buckets = [0] * self.window
+        self._window_total = 0
+        self._started = int(time.monotonic())
+        self._second = self._started
+
+    def _advance(self, second: int) -> None:
+        elapsed = second - self._second
+        if elapsed <= 0:
+            return
+        if elapsed >= self.window:
+            self._buckets = [0] * self.window
+            self._window_total = 0
+        else:
+            for s in range(self._second + 1, second + 1):
+                i = s % self.window
+                self._window_total -= self._buckets[i]
+                self._buckets[i] = 0
+        self._second = second
+
+    def add(self, n: int = 1) -> None:
+        second = int(time.monotonic())
+        self._advance(second)
+        self._buckets[second % self.window] += n
+        self._window_total += n
+        self.total += n
+
+    def rate(self) -> float:
+        """Eventos por segundo na janela (ou desde o início, se mais recente)"""
+        second = int(time.monotonic())
+        self._advance(second)
+        span = min(self.window, second - self._started + 1)
+        return self._window_total / span
+
+
+class Metrics:
+    """
+    Contadores de eventos do worker (mensagens, logins, ...) com
+    taxa por segundo em janela deslizante (METRICS_WINDOW_SECONDS).
+
+    Os módulos chamam incr() quando o evento acontece; /stats só lê
+    os valores prontos, sem percorrer sessões ou caches.
+    """
+
+    def __init__(self):
+        self.window_seconds = Config.METRICS_WINDOW_SECONDS
+        self._lock = threading.Lock()
+        self._events: Dict[str, RollingRate] = {}
+        self._started_at = time.monotonic()
+
+    def incr(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            counter = self._events.get(name)
+            if counter is None:
+                counter = self._events[name] = RollingRate(self.window_seconds)
+            counter.add(n)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "uptime_seconds": round(time.monotonic() - self._started_at, 1),
+                "window_seconds": self.window_seconds,
+                "events": {
+                    name: {"total": counter.total, "per_second": round(counter.rate(), 3)}
+                    for name, counter in sorted(self._events.items())
+                }
+            }
+
+# Instância global
+metrics = Metrics()
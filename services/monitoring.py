@@ -0,0 +1,384 @@
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+from config.settings import Config
+from models.entities import AlertSubscription
+from clients.tracker_api import tracker_api
+from clients.whatsapp import whatsapp_client
+
+if TYPE_CHECKING:
+    import numpy as np  # importado sob demanda (~70 ms na inicialização)
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def haversine_m(lat1, lng1, lat2, lng2) -> "np.ndarray":
+    """Distância em metros entre arrays de coordenadas (graus)"""
+    import numpy as np
+    lat1, lng1, lat2, lng2 = (np.radians(a) for a in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def points_in_polygons(lat: "np.ndarray", lng: "np.ndarray", poly_lat: "np.ndarray", poly_lng: "np.ndarray") -> "np.ndarray":
+    """
+    Ray casting vetorizado: ponto i contra o polígono da linha i.
+
+    Os polígonos têm tamanhos diferentes, então cada linha é completada
+    repetindo o último vértice (arestas degeneradas não cruzam o raio).
+
+    Args:
+        lat, lng: (n,) posições
+        poly_lat, poly_lng: (n, v) vértices
+
+    Returns:
+        np.ndarray: (n,) True se o ponto está dentro do polígono
+    """
+    import numpy as np
+    y = lat[:, None]
+    x = lng[:, None]
+    y_next = np.roll(poly_lat, 1, axis=1)
+    x_next = np.roll(poly_lng, 1, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crosses = ((poly_lat > y) != (y_next > y)) & (
+            x < (x_next - poly_lng) * (y - poly_lat) / (y_next - poly_lat) + poly_lng
+        )
+    return np.count_nonzero(crosses, axis=1) % 2 == 1
+
+
+class VehicleMonitor:
+    """
+    Monitoramento ativo de veículos com alertas via WhatsApp.
+
+    Alertas suportados por inscrição:
+    - Saída de cerca virtual (círculo ou polígono)
+    - Velocidade acima do limite
+    - Movimento com o veículo bloqueado
+
+    Um poller em segundo plano busca as posições de todos os
+    usuários num único pool limitado (cada veículo uma vez por
+    token) e avalia todas as regras de uma vez com NumPy. As
+    inscrições são convertidas em arrays apenas quando mudam.
+
+    Os alertas saem pelo template aprovado MONITOR_ALERT_TEMPLATE
+    (texto livre é recusado fora da janela de 24 h). As inscrições
+    terminam com a sessão (saída ou expiração) e quando o token é
+    recusado (401) por MONITOR_MAX_AUTH_FAILURES ciclos seguidos.
+    """
+
+    def __init__(self):
+        self.api = tracker_api
+        self.client = whatsapp_client
+        self.poll_interval = Config.MONITOR_POLL_INTERVAL_SECONDS
+        self.alert_template = Config.MONITOR_ALERT_TEMPLATE
+        self.alert_language = Config.MONITOR_ALERT_LANGUAGE
+        self.max_auth_failures = Config.MONITOR_MAX_AUTH_FAILURES
+        self.moving_speed = Config.MONITOR_MOVING_SPEED_KMH
+        self.moving_distance = Config.MONITOR_MOVING_DISTANCE_M
+
+        self._lock = threading.Lock()
+        self.subscriptions: Dict[Tuple[str, str], AlertSubscription] = {}  # (phone, vehicle_id) -> inscrição
+        self._vehicle_refs: Dict[str, int] = {}  # vehicle_id -> inscrições
+        self._by_phone: Dict[str, Set[str]] = {}  # phone -> vehicle_ids inscritos
+        self._auth_failures: Dict[str, int] = {}  # token -> ciclos seguidos com 401
+        self.blocked: Dict[str, bool] = {}  # vehicle_id -> bloqueado
+        self._dirty = True
+        self._keys: List[Tuple[str, str]] = []
+        self._subs: List[AlertSubscription] = []
+        self._arrays: Dict[str, "np.ndarray"] = {}
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {
+            "polls": 0,
+            "fetch_failures": 0,
+            "dropped_unauthorized": 0,
+            "alerts_geofence": 0,
+            "alerts_speed": 0,
+            "alerts_blocked_movement": 0,
+            "last_poll_seconds": 0.0,
+            "last_eval_ms": 0.0
+        }
+
+    def subscribe(self, subscription: AlertSubscription, is_blocked: bool = False) -> None:
+        """Adiciona ou substitui a inscrição de alertas de um veículo"""
+        with self._lock:
+            key = (subscription.phone_number, subscription.vehicle_id)
+            if key not in self.subscriptions:
+                self._vehicle_refs[subscription.vehicle_id] = self._vehicle_refs.get(subscription.vehicle_id, 0) + 1
+                self._by_phone.setdefault(subscription.phone_number, set()).add(subscription.vehicle_id)
+            self.subscriptions[key] = subscription
+            self.blocked[subscription.vehicle_id] = is_blocked
+            self._dirty = True
+        logger.info(f"[MONITOR] Inscricao: {subscription.phone_number} -> {subscription.plate}")
+        self._ensure_running()
+
+    def unsubscribe(self, phone_number: str, vehicle_id: str) -> bool:
+        """Remove a inscrição. Retorna False se não existia"""
+        with self._lock:
+            if not self._remove(phone_number, vehicle_id):
+                return False
+        logger.info(f"[MONITOR] Inscricao removida: {phone_number} -> {vehicle_id}")
+        return True
+
+    def unsubscribe_all(self, phone_number: str) -> int:
+        """Remove todas as inscrições do telefone (fim da sessão)"""
+        with self._lock:
+            vehicle_ids = list(self._by_phone.get(phone_number, ()))
+            for vehicle_id in vehicle_ids:
+                self._remove(phone_number, vehicle_id)
+        if vehicle_ids:
+            logger.info(f"[MONITOR] {len(vehicle_ids)} inscricoes removidas: {phone_number}")
+        return len(vehicle_ids)
+
+    def _remove(self, phone_number: str, vehicle_id: str) -> bool:
+        """Remove uma inscrição (chamado com o lock)"""
+        if self.subscriptions.pop((phone_number, vehicle_id), None) is None:
+            return False
+        vehicle_ids = self._by_phone[phone_number]
+        vehicle_ids.discard(vehicle_id)
+        if not vehicle_ids:
+            del self._by_phone[phone_number]
+        if self._vehicle_refs[vehicle_id] > 1:
+            self._vehicle_refs[vehicle_id] -= 1
+        else:
+            del self._vehicle_refs[vehicle_id]
+            self.blocked.pop(vehicle_id, None)  # só interessa enquanto monitorado
+        self._dirty = True
+        return True
+
+    def is_subscribed(self, phone_number: str, vehicle_id: str) -> bool:
+        return (phone_number, vehicle_id) in self.subscriptions
+
+    def set_blocked(self, vehicle_id: str, is_blocked: bool) -> None:
+        """Atualiza o estado de bloqueio usado no alerta de movimento"""
+        with self._lock:
+            if vehicle_id in self.blocked and self.blocked[vehicle_id] != is_blocked:
+                self.blocked[vehicle_id] = is_blocked
+                self._dirty = True
+
+    def _ensure_running(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="vehicle-monitor", daemon=True)
+        self._thread.start()
+        logger.info(f"[MONITOR] Poller iniciado (intervalo {self.poll_interval}s)")
+
+    def _run(self) -> None:
+        while True:
+            started_at = time.monotonic()
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error(f"[MONITOR] Erro no ciclo de monitoramento: {e}", exc_info=True)
+            time.sleep(max(0.0, self.poll_interval - (time.monotonic() - started_at)))
+
+    def _rebuild(self) -> None:
+        """
+        Converte as inscrições em arrays (chamado com o lock).
+
+        O estado de cada inscrição (dentro da cerca, acima do limite,
+        última posição) é preservado entre reconstruções.
+        """
+        import numpy as np
+        keys = list(self.subscriptions)
+        subs = [self.subscriptions[k] for k in keys]
+        n = len(subs)
+        max_vertices = max((len(s.geofence_polygon) for s in subs if s.geofence_polygon), default=1)
+
+        arrays = {
+            "center_lat": np.full(n, np.nan),
+            "center_lng": np.full(n, np.nan),
+            "radius": np.full(n, np.nan),
+            "poly_lat": np.full((n, max_vertices), np.nan),
+            "poly_lng": np.full((n, max_vertices), np.nan),
+            "has_polygon": np.zeros(n, dtype=bool),
+            "speed_limit": np.full(n, np.nan),
+            "blocked_movement": np.array([s.blocked_movement for s in subs], dtype=bool),
+            "blocked": np.array([self.blocked.get(s.vehicle_id, False) for s in subs], dtype=bool),
+            # Estado
+            "observed": np.zeros(n, dtype=bool),
+            "inside": np.zeros(n, dtype=bool),
+            "speeding": np.zeros(n, dtype=bool),
+            "moving_alerted": np.zeros(n, dtype=bool),
+            "last_lat": np.full(n, np.nan),
+            "last_lng": np.full(n, np.nan)
+        }
+
+        for i, s in enumerate(subs):
+            if s.geofence_center and s.geofence_radius_m:
+                arrays["center_lat"][i], arrays["center_lng"][i] = s.geofence_center
+                arrays["radius"][i] = s.geofence_radius_m
+                # Inscrição feita com o veículo na posição central
+                arrays["observed"][i] = True
+                arrays["inside"][i] = True
+            elif s.geofence_polygon and len(s.geofence_polygon) >= 3:
+                vertices = list(s.geofence_polygon)
+                vertices += [vertices[-1]] * (max_vertices - len(vertices))
+                arrays["poly_lat"][i] = [v[0] for v in vertices]
+                arrays["poly_lng"][i] = [v[1] for v in vertices]
+                arrays["has_polygon"][i] = True
+            if s.speed_limit:
+                arrays["speed_limit"][i] = s.speed_limit
+
+        old_index = {k: i for i, k in enumerate(self._keys)}
+        for i, k in enumerate(keys):
+            j = old_index.get(k)
+            if j is None:
+                continue
+            for name in ("observed", "inside", "speeding", "moving_alerted", "last_lat", "last_lng"):
+                arrays[name][i] = self._arrays[name][j]
+
+        self._keys = keys
+        self._subs = subs
+        self._arrays = arrays
+        self._dirty = False
+
+    def _fetch_positions(self, subs: List[AlertSubscription]) -> Dict[Tuple[str, str], Optional[dict]]:
+        """
+        Busca cada veículo uma vez por token, todos os tokens no mesmo
+        pool limitado (TRACKER_FETCH_CONCURRENCY), e conta os 401.
+        Cada inscrição só usa a posição obtida com o próprio token.
+        """
+        pairs = list(dict.fromkeys((s.vehicle_id, s.token) for s in subs))
+        positions: Dict[Tuple[str, str], Optional[dict]] = {}
+        rejected, accepted = set(), set()
+        for (vehicle_id, token), (location, status) in self.api.fetch_locations(pairs).items():
+            positions[(vehicle_id, token)] = location
+            if status == 401:
+                rejected.add(token)
+            elif status is not None:
+                accepted.add(token)
+
+        # Só contam ciclos seguidos: tokens fora deste ciclo zeram
+        self._auth_failures = {t: self._auth_failures.get(t, 0) + 1 for t in rejected - accepted}
+        expired = [t for t, n in self._auth_failures.items() if n >= self.max_auth_failures]
+        if expired:
+            self._drop_tokens(set(expired))
+        return positions
+
+    def _drop_tokens(self, tokens: Set[str]) -> None:
+        """Remove as inscrições cujo token a API recusa"""
+        with self._lock:
+            keys = [k for k, s in self.subscriptions.items() if s.token in tokens]
+            for phone_number, vehicle_id in keys:
+                self._remove(phone_number, vehicle_id)
+        for token in tokens:
+            self._auth_failures.pop(token, None)
+        self.stats["dropped_unauthorized"] += len(keys)
+        logger.warning(f"[MONITOR] {len(keys)} inscricoes removidas: token recusado (401)")
+
+    def poll_once(self) -> int:
+        """
+        Executa um ciclo: busca posições, avalia regras e envia alertas.
+
+        Returns:
+            int: Número de alertas gerados
+        """
+        started_at = time.monotonic()
+        with self._lock:
+            if self._dirty:
+                self._rebuild()
+            keys, subs, arrays = self._keys, self._subs, self._arrays
+
+        if not keys:
+            return 0
+
+        positions = self._fetch_positions(subs)
+        self.stats["fetch_failures"] += sum(1 for p in positions.values() if not p)
+
+        eval_started_at = time.monotonic()
+        alerts = self._evaluate(subs, arrays, positions)
+        self.stats["last_eval_ms"] = round((time.monotonic() - eval_started_at) * 1000, 3)
+
+        if alerts:
+            self.client.send_bulk(
+                [{"to": phone, "params": params} for phone, params in alerts],
+                self.alert_template,
+                language=self.alert_language
+            )
+
+        self.stats["polls"] += 1
+        self.stats["last_poll_seconds"] = round(time.monotonic() - started_at, 3)
+        return len(alerts)
+
+    def _evaluate(self, subs: List[AlertSubscription], a: Dict[str, "np.ndarray"], positions: Dict[Tuple[str, str], Optional[dict]]) -> List[Tuple[str, List[str]]]:
+        """Avalia todas as regras de forma vetorizada e atualiza o estado"""
+        import numpy as np
+        n = len(subs)
+        lat = np.full(n, np.nan)
+        lng = np.full(n, np.nan)
+        speed = np.full(n, np.nan)
+        for i, s in enumerate(subs):
+            p = positions.get((s.vehicle_id, s.token))
+            if p:
+                lat[i] = _to_float(p.get("latitude"))
+                lng[i] = _to_float(p.get("longitude"))
+                speed[i] = _to_float(p.get("speed"))
+        valid = ~np.isnan(lat) & ~np.isnan(lng)
+
+        # Cerca virtual: alerta na transição dentro -> fora
+        has_circle = ~np.isnan(a["radius"])
+        inside_circle = haversine_m(lat, lng, a["center_lat"], a["center_lng"]) <= a["radius"]
+        inside_polygon = points_in_polygons(lat, lng, a["poly_lat"], a["poly_lng"]) & a["has_polygon"]
+        inside = np.where(has_circle, inside_circle, inside_polygon)
+        fenced = valid & (has_circle | a["has_polygon"])
+        geofence_exit = fenced & a["observed"] & a["inside"] & ~inside
+        a["inside"] = np.where(fenced, inside, a["inside"])
+        a["observed"] |= fenced
+
+        # Velocidade: alerta ao ultrapassar, rearma abaixo de 90% do limite
+        over = valid & (speed > a["speed_limit"])
+        speed_alert = over & ~a["speeding"]
+        still_speeding = np.where(a["speeding"], speed > a["speed_limit"] * 0.9, over)
+        a["speeding"] = np.where(valid, still_speeding, a["speeding"])
+
+        # Movimento com veículo bloqueado: velocidade ou deslocamento
+        moved = haversine_m(a["last_lat"], a["last_lng"], lat, lng) > self.moving_distance
+        moving = valid & ((speed > self.moving_speed) | moved)
+        watch = a["blocked"] & a["blocked_movement"]
+        blocked_alert = watch & moving & ~a["moving_alerted"]
+        a["moving_alerted"] = np.where(valid, watch & moving, a["moving_alerted"])
+        a["last_lat"] = np.where(valid, lat, a["last_lat"])
+        a["last_lng"] = np.where(valid, lng, a["last_lng"])
+
+        alerts = []
+        for i in np.flatnonzero(geofence_exit):
+            alerts.append((subs[i].phone_number, _alert_params(
+                f"ALERTA: o veiculo {subs[i].plate} saiu da cerca virtual.", lat[i], lng[i])))
+        for i in np.flatnonzero(speed_alert):
+            alerts.append((subs[i].phone_number, _alert_params(
+                f"ALERTA: o veiculo {subs[i].plate} esta a {speed[i]:.0f} km/h "
+                f"(limite {a['speed_limit'][i]:.0f} km/h).", lat[i], lng[i])))
+        for i in np.flatnonzero(blocked_alert):
+            alerts.append((subs[i].phone_number, _alert_params(
+                f"ALERTA: o veiculo {subs[i].plate} esta BLOQUEADO e em movimento.", lat[i], lng[i])))
+
+        self.stats["alerts_geofence"] += int(np.count_nonzero(geofence_exit))
+        self.stats["alerts_speed"] += int(np.count_nonzero(speed_alert))
+        self.stats["alerts_blocked_movement"] += int(np.count_nonzero(blocked_alert))
+        return alerts
+
+    def get_stats(self) -> dict:
+        return {
+            "subscriptions": len(self.subscriptions),
+            "vehicles": len(self._vehicle_refs),
+            **self.stats
+        }
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _alert_params(text: str, lat: float, lng: float) -> List[str]:
+    """Parâmetros do template: {{1}} texto do alerta, {{2}} link do mapa"""
+    return [text, f"https://maps.google.com/?q={lat},{lng}"]
+
+# Instância global
+vehicle_monitor = VehicleMonitor()
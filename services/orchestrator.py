@@ -1,6 +1,9 @@
 import logging
 from models.entities import Session
 from services.session_manager import session_manager
+from services.journal import journal
+from services.dedup import message_dedup
+from services.metrics import metrics
 from handlers.message_handlers import MessageHandler
 
 logger = logging.getLogger(__name__)
@@ -10,7 +13,8 @@ class MessageOrchestrator:
     Orquestrador de mensagens com deduplicação.
     
     Responsável por:
-    1. Verificar se mensagem já foi processada (deduplicação)
+    1. Verificar se mensagem já foi processada (deduplicação entre
+       os workers do host, via memória compartilhada)
     2. Marcar mensagem como processada
     3. Obter/criar sessão do usuário
     4. Delegar processamento ao handler apropriado
@@ -18,6 +22,7 @@ class MessageOrchestrator:
     
     def __init__(self):
         self.handler = MessageHandler()
+        self.dedup = message_dedup
     
     def process_message(
         self, 
@@ -36,15 +41,16 @@ class MessageOrchestrator:
             message_id: ID único da mensagem para deduplicação
         """
         
-        # PASSO 1: Deduplicação - Verificar se já foi processada
-        if message_id and session_manager.is_message_processed(phone_number, message_id):
+        # PASSO 1 e 2: Deduplicação - verificar e marcar como processada
+        # ANTES de processar, numa única operação atômica
+        # (previne race conditions se mesma mensagem chegar simultaneamente,
+        # inclusive em outro worker)
+        if message_id and not self._claim(phone_number, message_id):
             logger.info(f"[DEDUP] Mensagem duplicada ignorada: {message_id[:20]}... de {phone_number}")
+            metrics.incr("duplicates")
+            journal.record_done(message_id)
             return
-        
-        # PASSO 2: Marcar como processada ANTES de processar
-        # (previne race conditions se mesma mensagem chegar simultaneamente)
-        if message_id:
-            session_manager.mark_message_processed(phone_number, message_id)
+        metrics.incr("messages")
         
         # PASSO 3: Obter sessão do usuário
         session = session_manager.get_session(phone_number)
@@ -57,7 +63,25 @@ class MessageOrchestrator:
             self.handler.handle(session, message, message_type)
         except Exception as e:
             logger.error(f"[ERROR] Erro ao processar mensagem {message_id}: {e}", exc_info=True)
+            metrics.incr("errors")
             # Não re-raise - queremos que o webhook retorne 200 mesmo com erro interno
+        finally:
+            # PASSO 6: Marcar conclusão no journal (não será reprocessada)
+            journal.record_done(message_id)
+            session_manager.release_session(phone_number)
+    
+    def _claim(self, phone_number: str, message_id: str) -> bool:
+        """True se a mensagem ainda não foi processada (e fica marcada)"""
+        if self.dedup.available:
+            claimed = self.dedup.claim(message_id)
+            if claimed is not None:
+                return claimed
+        
+        # Sem memória compartilhada (ou tabela cheia): deduplicação por worker
+        if session_manager.is_message_processed(phone_number, message_id):
+            return False
+        session_manager.mark_message_processed(phone_number, message_id)
+        return True
 
 # Instância global
 orchestrator = MessageOrchestrator()
\ No newline at end of file
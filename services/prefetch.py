@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+from config.settings import Config
+from clients.tracker_api import tracker_api
+
+logger = logging.getLogger(__name__)
+
+
+class _Slot:
+    __slots__ = ("future", "token", "started_at", "finished_at", "expires_at")
+
+    def __init__(self, future: Future, token: str, started_at: float, expires_at: float):
+        self.future = future
+        self.token = token
+        self.started_at = started_at
+        self.finished_at: Optional[float] = None
+        self.expires_at = expires_at
+
+
+class LocationPrefetcher:
+    """
+    Busca especulativa da localização (opcional, PREFETCH_ENABLED).
+
+    Quando as opções de um veículo são mostradas, a próxima ação
+    quase sempre é "Localizacao". A consulta ao rastreador começa em
+    segundo plano e o resultado fica num slot por (telefone, veículo)
+    válido por PREFETCH_TTL_SECONDS; a ação de localização usa o slot
+    (uma única vez) em vez de esperar uma nova consulta.
+
+    Métricas: quantos prefetches foram usados e quanto tempo de
+    espera o usuário deixou de ter (latência economizada).
+    """
+
+    def __init__(self, fetch: Callable[[str, str], Optional[dict]]):
+        self.fetch = fetch
+        self.enabled = Config.PREFETCH_ENABLED
+        self.ttl = Config.PREFETCH_TTL_SECONDS
+        self.wait_timeout = Config.SESSION_TIMEOUT_MINUTES  # mesmo timeout das consultas ao rastreador
+        self.max_workers = Config.PREFETCH_WORKERS
+
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Dict[Tuple[str, str], _Slot] = {}
+
+        self.stats = {
+            "issued": 0,
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "failed": 0,
+            "latency_saved_ms": 0.0
+        }
+
+    def prefetch(self, phone_number: str, vehicle_id: str, token: str) -> None:
+        """Inicia a consulta em segundo plano (não bloqueia)"""
+        if not self.enabled or not token:
+            return
+        now = time.monotonic()
+        key = (phone_number, vehicle_id)
+        with self._lock:
+            self._purge(now)
+            slot = self._slots.get(key)
+            if slot and slot.token == token and slot.expires_at > now:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prefetch")
+            future = self._executor.submit(self.fetch, vehicle_id, token)
+            slot = _Slot(future, token, now, now + self.ttl)
+            self._slots[key] = slot
+            self.stats["issued"] += 1
+        future.add_done_callback(lambda _f, s=slot: setattr(s, "finished_at", time.monotonic()))
+
+    def take(self, phone_number: str, vehicle_id: str, token: str) -> Optional[dict]:
+        """
+        Consome o slot, esperando a consulta se ainda estiver em andamento.
+
+        Returns:
+            dict ou None (sem slot válido: o chamador consulta normalmente)
+        """
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            slot = self._slots.pop((phone_number, vehicle_id), None)
+        if slot is None or slot.token != token or slot.expires_at <= now:
+            with self._lock:
+                self.stats["misses"] += 1
+                if slot is not None:
+                    self.stats["expired"] += 1
+            return None
+
+        try:
+            location = slot.future.result(timeout=self.wait_timeout)
+        except Exception as e:
+            logger.warning(f"[PREFETCH] Consulta especulativa falhou para {vehicle_id}: {e}")
+            location = None
+
+        with self._lock:
+            if location is None:
+                self.stats["failed"] += 1
+                self.stats["misses"] += 1
+                return None
+            # Concluída antes do toque: economizou a consulta inteira;
+            # ainda em andamento: economizou o tempo já decorrido
+            finished_at = slot.finished_at or time.monotonic()
+            saved = min(finished_at, now) - slot.started_at
+            self.stats["hits"] += 1
+            self.stats["latency_saved_ms"] += saved * 1000
+        return location
+
+    def _purge(self, now: float) -> None:
+        """Descarta slots vencidos sem uso (chamado com o lock)"""
+        expired = [key for key, slot in self._slots.items() if slot.expires_at <= now]
+        for key in expired:
+            del self._slots[key]
+        self.stats["expired"] += len(expired)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            hits = self.stats["hits"]
+            lookups = hits + self.stats["misses"]
+            return {
+                "enabled": self.enabled,
+                "pending_slots": len(self._slots),
+                **self.stats,
+                "latency_saved_ms": round(self.stats["latency_saved_ms"], 1),
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "use_rate": round(hits / self.stats["issued"], 4) if self.stats["issued"] else 0.0,
+                "avg_saved_ms": round(self.stats["latency_saved_ms"] / hits, 1) if hits else 0.0
+            }
+
+# Instância global
+location_prefetcher = LocationPrefetcher(tracker_api.get_vehicle_location)
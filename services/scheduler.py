@@ -0,0 +1,243 @@
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional, Set
+from config.settings import Config
+from handlers.message_handlers import BLOCK_COMMANDS, UNBLOCK_COMMANDS, LOCATION_COMMANDS
+from services.orchestrator import orchestrator
+
+logger = logging.getLogger(__name__)
+
+# Faixas de prioridade (menor índice = maior prioridade)
+LANE_COMMAND = 0      # bloquear / desbloquear
+LANE_LOCATION = 1     # localizacao
+LANE_NAVIGATION = 2   # menus, seleção de veículo, login, etc
+LANE_NAMES = ("command", "location", "navigation")
+
+
+@dataclass
+class WorkItem:
+    phone_number: str
+    message: str
+    message_type: str
+    message_id: Optional[str]
+    lane: int
+    seq: int
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class SchedulerFull(Exception):
+    """Fila cheia por mais que o tempo de espera do submit()"""
+
+
+def classify_message(message: str) -> int:
+    """
+    Classifica a mensagem na faixa de prioridade.
+
+    Usa os mesmos aliases reconhecidos por _handle_vehicle_action.
+    """
+    msg_lower = message.lower().strip()
+    if msg_lower in BLOCK_COMMANDS or msg_lower in UNBLOCK_COMMANDS:
+        return LANE_COMMAND
+    if msg_lower in LOCATION_COMMANDS:
+        return LANE_LOCATION
+    return LANE_NAVIGATION
+
+
+class PriorityScheduler:
+    """
+    Fila de processamento com faixas de prioridade.
+
+    Comandos de bloqueio/desbloqueio passam na frente de consultas
+    de localização, que passam na frente da navegação.
+
+    Garantias:
+    1. Mensagens do mesmo telefone são processadas em ordem de chegada
+       e nunca em paralelo (a máquina de estados da sessão depende disso)
+    2. Proteção contra inanição: item que espera mais que max_wait_ms
+       é atendido antes dos itens mais novos de faixas prioritárias
+    """
+
+    def __init__(self, processor: Callable[[str, str, str, Optional[str]], None]):
+        self.processor = processor
+        self.num_workers = Config.SCHEDULER_WORKERS
+        self.max_wait = Config.SCHEDULER_MAX_WAIT_MS / 1000.0
+        self.max_pending = Config.SCHEDULER_MAX_PENDING
+        self.submit_timeout = Config.SCHEDULER_SUBMIT_TIMEOUT_MS / 1000.0
+
+        self._cond = threading.Condition()
+        self._lanes: List[Deque[WorkItem]] = [deque() for _ in LANE_NAMES]
+        self._pending_by_phone: Dict[str, Deque[int]] = {}  # phone -> seqs em ordem
+        self._busy_phones: Set[str] = set()
+        self._seq = 0
+        self._pending = 0
+        self._workers: List[threading.Thread] = []
+
+        # Estatísticas por faixa
+        self._lane_stats = [
+            {"enqueued": 0, "dispatched": 0, "processed": 0, "promoted": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for _ in LANE_NAMES
+        ]
+        self._wait_samples: List[Deque[float]] = [deque(maxlen=1000) for _ in LANE_NAMES]
+        self._stats_rejected = 0
+
+    def submit(
+        self,
+        phone_number: str,
+        message: str,
+        message_type: str = "text",
+        message_id: str = None,
+        wait: bool = True
+    ) -> None:
+        """
+        Enfileira uma mensagem para processamento assíncrono.
+
+        Se a fila estiver cheia, espera vaga por até submit_timeout
+        (backpressure no webhook). A mensagem nunca é processada fora
+        da fila: isso furaria a ordem por telefone (garantia 1).
+
+        Args:
+            wait: False = espera sem limite (reprocessamento do journal)
+
+        Raises:
+            SchedulerFull: fila ainda cheia após submit_timeout
+        """
+        lane = classify_message(message)
+
+        with self._cond:
+            self._ensure_workers()
+            if self._pending >= self.max_pending:
+                logger.warning(f"[SCHED] Fila cheia ({self._pending}) - aguardando vaga: {phone_number}")
+                timeout = self.submit_timeout if wait else None
+                if not self._cond.wait_for(lambda: self._pending < self.max_pending, timeout=timeout):
+                    self._stats_rejected += 1
+                    raise SchedulerFull(f"fila cheia ({self._pending} pendentes)")
+            self._seq += 1
+            item = WorkItem(phone_number, message, message_type, message_id, lane, self._seq)
+            self._lanes[lane].append(item)
+            self._pending_by_phone.setdefault(phone_number, deque()).append(item.seq)
+            self._pending += 1
+            self._lane_stats[lane]["enqueued"] += 1
+            self._cond.notify_all()
+
+    def _ensure_workers(self) -> None:
+        """Inicia as threads de trabalho sob demanda (chamado com o lock)"""
+        if self._workers:
+            return
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"scheduler-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        logger.info(f"[SCHED] {self.num_workers} workers iniciados")
+
+    def _is_eligible(self, item: WorkItem) -> bool:
+        if item.phone_number in self._busy_phones:
+            return False
+        return self._pending_by_phone[item.phone_number][0] == item.seq
+
+    def _pick(self) -> Optional[WorkItem]:
+        """
+        Escolhe o próximo item (chamado com o lock).
+
+        Para cada faixa, pega o primeiro item elegível. Se algum deles
+        passou do tempo máximo de espera, o mais antigo é atendido;
+        senão, vence a faixa de maior prioridade.
+        """
+        now = time.monotonic()
+        candidates = []
+        for lane_items in self._lanes:
+            for index, item in enumerate(lane_items):
+                if self._is_eligible(item):
+                    candidates.append((index, item))
+                    break
+
+        if not candidates:
+            return None
+
+        overdue = [c for c in candidates if now - c[1].enqueued_at > self.max_wait]
+        if overdue:
+            index, item = min(overdue, key=lambda c: c[1].enqueued_at)
+            if item.lane != candidates[0][1].lane:
+                self._lane_stats[item.lane]["promoted"] += 1
+        else:
+            index, item = candidates[0]
+
+        del self._lanes[item.lane][index]
+        self._busy_phones.add(item.phone_number)
+        self._record_wait(item.lane, now - item.enqueued_at)
+        return item
+
+    def _record_wait(self, lane: int, wait: float) -> None:
+        stats = self._lane_stats[lane]
+        stats["dispatched"] += 1
+        stats["wait_total"] += wait
+        stats["wait_max"] = max(stats["wait_max"], wait)
+        self._wait_samples[lane].append(wait)
+
+    def _finish(self, item: WorkItem) -> None:
+        """Libera o telefone e avisa os workers (chamado com o lock)"""
+        self._busy_phones.discard(item.phone_number)
+        seqs = self._pending_by_phone[item.phone_number]
+        seqs.popleft()
+        if not seqs:
+            del self._pending_by_phone[item.phone_number]
+        self._pending -= 1
+        self._lane_stats[item.lane]["processed"] += 1
+        self._cond.notify_all()
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self._cond:
+                item = self._pick()
+                while item is None:
+                    # Timeout para reavaliar itens que passaram do tempo máximo
+                    self._cond.wait(timeout=self.max_wait)
+                    item = self._pick()
+
+            try:
+                self.processor(item.phone_number, item.message, item.message_type, item.message_id)
+            except Exception as e:
+                logger.error(f"[SCHED] Erro ao processar item de {item.phone_number}: {e}", exc_info=True)
+            finally:
+                with self._cond:
+                    self._finish(item)
+
+    def get_stats(self) -> dict:
+        """
+        Retorna estatísticas de fila por faixa.
+
+        Returns:
+            dict: Itens pendentes e tempo de espera (ms) por faixa
+        """
+        with self._cond:
+            lanes = {}
+            for lane, name in enumerate(LANE_NAMES):
+                stats = self._lane_stats[lane]
+                samples = sorted(self._wait_samples[lane])
+                lanes[name] = {
+                    "pending": len(self._lanes[lane]),
+                    "enqueued": stats["enqueued"],
+                    "processed": stats["processed"],
+                    "promoted": stats["promoted"],
+                    "wait_avg_ms": round(stats["wait_total"] / stats["dispatched"] * 1000, 2) if stats["dispatched"] else 0.0,
+                    "wait_p50_ms": round(_percentile(samples, 0.50) * 1000, 2),
+                    "wait_p95_ms": round(_percentile(samples, 0.95) * 1000, 2),
+                    "wait_max_ms": round(stats["wait_max"] * 1000, 2)
+                }
+            return {
+                "workers": len(self._workers),
+                "pending": self._pending,
+                "rejected": self._stats_rejected,
+                "lanes": lanes
+            }
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+# Instância global
+scheduler = PriorityScheduler(orchestrator.process_message)
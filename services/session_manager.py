@@ -1,11 +1,105 @@
+import atexit
+import glob
 import logging
-from typing import Dict, Optional, Set
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set
 from datetime import datetime, timedelta
 from models.entities import Session
+from services.metrics import metrics
 from config.settings import Config
 
 logger = logging.getLogger(__name__)
 
+class SessionSpillStore:
+    """
+    Armazenamento local das sessões removidas da memória.
+    
+    Um arquivo SQLite por processo (sessions-<pid>.db); cada sessão
+    é gravada serializada com pickle e comprimida com zlib.
+    Arquivos de processos que não existem mais são removidos.
+    
+    O número de sessões no disco é mantido a cada operação (count()
+    não consulta o banco). put() recebe apenas telefones que não estão
+    no disco: a sessão residente saiu de lá por pop() ou nunca esteve.
+    """
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._count = 0
+    
+    def _db(self) -> sqlite3.Connection:
+        pid = os.getpid()
+        if self._conn is not None and self._pid == pid:
+            return self._conn
+        # Após fork o processo filho precisa do seu próprio arquivo
+        os.makedirs(self.directory, exist_ok=True)
+        self._remove_stale()
+        self._pid = pid
+        path = os.path.join(self.directory, f"sessions-{pid}.db")
+        if os.path.exists(path):
+            os.remove(path)  # sobra de execução anterior com o mesmo PID
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        os.chmod(path, 0o600)  # sessões contêm token do usuário
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(
+            "CREATE TABLE sessions (phone_number TEXT PRIMARY KEY, data BLOB NOT NULL, last_activity REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX idx_sessions_last_activity ON sessions (last_activity)")
+        self._count = 0
+        return self._conn
+    
+    def _remove_stale(self) -> None:
+        for path in glob.glob(os.path.join(self.directory, "sessions-*.db")):
+            try:
+                pid = int(os.path.basename(path)[len("sessions-"):-len(".db")])
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                os.remove(path)
+            except (ValueError, OSError):
+                continue
+    
+    def put(self, phone_number: str, data: bytes, last_activity: float) -> None:
+        self._db().execute(
+            "INSERT OR REPLACE INTO sessions (phone_number, data, last_activity) VALUES (?, ?, ?)",
+            (phone_number, data, last_activity)
+        )
+        self._count += 1
+    
+    def pop(self, phone_number: str) -> Optional[bytes]:
+        if self._conn is None:
+            return None
+        row = self._db().execute(
+            "DELETE FROM sessions WHERE phone_number = ? RETURNING data", (phone_number,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._count -= 1
+        return row[0]
+    
+    def purge(self, older_than: float) -> List[str]:
+        """Remove as sessões sem atividade desde older_than e retorna os telefones"""
+        if self._conn is None:
+            return []
+        rows = self._db().execute(
+            "DELETE FROM sessions WHERE last_activity < ? RETURNING phone_number", (older_than,)
+        ).fetchall()
+        self._count -= len(rows)
+        return [row[0] for row in rows]
+    
+    def count(self) -> int:
+        if self._pid != os.getpid():
+            return 0  # arquivo de outro processo (antes do fork)
+        return self._count
+
 class SessionManager:
     """
     Gerenciador de sessões com deduplicação de mensagens.
@@ -13,37 +107,108 @@ class SessionManager:
     IMPORTANTE: Em produção com múltiplos workers Gunicorn,
     este gerenciador é POR WORKER. Para compartilhar estado
     entre workers, use Redis ou banco de dados.
+    
+    Thread-safe: o scheduler processa mensagens de telefones
+    diferentes em paralelo dentro do mesmo worker.
+    
+    Memória limitada: acima de SESSION_MAX_RESIDENT sessões ou
+    SESSION_MAX_BYTES (tamanho serializado), as sessões há mais
+    tempo sem atividade vão para o disco (SESSION_SPILL_DIR) e
+    voltam na próxima mensagem do telefone. Sessões em uso
+    (entre get_session e release_session) nunca são removidas.
+    
+    Contagens (sessões, usuários e IDs de mensagem) são mantidas a
+    cada alteração: get_active_count e get_stats não percorrem as
+    sessões.
+    
+    Quem guarda estado por telefone (ex: inscrições de alertas) se
+    registra com add_end_listener para saber quando a sessão termina
+    (end_session ou expiração, na memória ou no disco).
     """
     
     def __init__(self):
-        self.sessions: Dict[str, Session] = {}
+        self._lock = threading.RLock()
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()  # ordem = atividade (LRU primeiro)
         self.processed_messages: Dict[str, Set[str]] = {}  # phone -> set(message_ids)
+        self._processed_total = 0  # soma dos tamanhos de processed_messages
         self.timeout_minutes = Config.SESSION_TIMEOUT_MINUTES
         
         # Configuração de limpeza automática
         self.max_messages_per_user = 100  # Limitar memória
         self.cleanup_counter = 0
         self.cleanup_interval = 50  # Limpar a cada 50 operações
+        
+        # Limite de memória
+        self.max_resident = Config.SESSION_MAX_RESIDENT
+        self.max_bytes = Config.SESSION_MAX_BYTES
+        self.spill = SessionSpillStore(Config.SESSION_SPILL_DIR) if Config.SESSION_SPILL_DIR else None
+        self._sizes: Dict[str, int] = {}  # phone -> tamanho serializado
+        self._resident_bytes = 0
+        self._in_use: Dict[str, int] = {}
+        self._started_at = time.monotonic()
+        self.counters = {"evictions": 0, "reloads": 0, "dropped": 0, "spill_errors": 0}
+        self.snapshot_path = Config.SESSION_SNAPSHOT_PATH
+        self._end_listeners: List[Callable[[str], None]] = []
+        
+        if self.snapshot_path:
+            atexit.register(self.save_snapshot)
+    
+    def add_end_listener(self, listener: Callable[[str], None]) -> None:
+        """Registra uma função chamada com o telefone quando a sessão termina"""
+        self._end_listeners.append(listener)
+    
+    def _notify_end(self, phone_number: str) -> None:
+        for listener in self._end_listeners:
+            try:
+                listener(phone_number)
+            except Exception as e:
+                logger.error(f"Erro ao notificar fim da sessao de {phone_number}: {e}")
     
     def get_session(self, phone_number: str) -> Session:
         """
         Obtém ou cria uma sessão para o telefone.
         
+        A sessão fica marcada como em uso até release_session.
+        
         Args:
             phone_number: Número do telefone do usuário
             
         Returns:
             Session: Sessão do usuário
         """
-        self._auto_cleanup()
-        
-        if phone_number not in self.sessions:
-            self.sessions[phone_number] = Session(phone_number=phone_number)
-            logger.info(f"Nova sessao criada para {phone_number}")
+        with self._lock:
+            self._auto_cleanup()
+            
+            if not self._make_resident(phone_number):
+                self.sessions[phone_number] = Session(phone_number=phone_number)
+                metrics.incr("sessions_created")
+                logger.info(f"Nova sessao criada para {phone_number}")
+            
+            session = self.sessions[phone_number]
+            session.update_activity()
+            self.sessions.move_to_end(phone_number)
+            self._in_use[phone_number] = self._in_use.get(phone_number, 0) + 1
+            self._enforce_limits()
+            return session
+    
+    def release_session(self, phone_number: str) -> None:
+        """
+        Fim do processamento da mensagem: atualiza o tamanho
+        da sessão e aplica os limites de memória.
         
-        session = self.sessions[phone_number]
-        session.update_activity()
-        return session
+        Args:
+            phone_number: Número do telefone
+        """
+        with self._lock:
+            count = self._in_use.get(phone_number, 0) - 1
+            if count > 0:
+                self._in_use[phone_number] = count
+            else:
+                self._in_use.pop(phone_number, None)
+            
+            if phone_number in self.sessions:
+                self._set_size(phone_number, len(self._serialize(phone_number)))
+            self._enforce_limits()
     
     def end_session(self, phone_number: str) -> bool:
         """
@@ -55,21 +220,28 @@ class SessionManager:
         Returns:
             bool: True se sessão foi encerrada, False se não existia
         """
-        if phone_number in self.sessions:
-            del self.sessions[phone_number]
-            
-            # Limpar mensagens processadas também
-            if phone_number in self.processed_messages:
-                del self.processed_messages[phone_number]
-            
-            logger.info(f"Sessao encerrada para {phone_number}")
-            return True
-        return False
+        with self._lock:
+            self._make_resident(phone_number)
+            if phone_number in self.sessions:
+                del self.sessions[phone_number]
+                self._set_size(phone_number, 0)
+                
+                # Limpar mensagens processadas também
+                self._set_processed(phone_number, None)
+                self._notify_end(phone_number)
+                
+                logger.info(f"Sessao encerrada para {phone_number}")
+                return True
+            return False
     
     def get_active_count(self) -> int:
-        """Retorna número de sessões ativas"""
-        self._cleanup_expired()
-        return len(self.sessions)
+        """
+        Retorna número de sessões ativas (em memória e em disco).
+        
+        O(1), sem lock: usado pelo /health. Sessões expiradas contam
+        até a próxima limpeza periódica (_auto_cleanup).
+        """
+        return len(self.sessions) + self._spilled_count()
     
     def is_message_processed(self, phone_number: str, message_id: str) -> bool:
         """
@@ -85,6 +257,10 @@ class SessionManager:
         if not message_id:
             return False
         
+        with self._lock:
+            # Mensagens processadas vão para o disco junto com a sessão
+            self._make_resident(phone_number)
+        
         if phone_number not in self.processed_messages:
             return False
         
@@ -101,37 +277,253 @@ class SessionManager:
         if not message_id:
             return
         
-        # Inicializar conjunto se não existir
-        if phone_number not in self.processed_messages:
-            self.processed_messages[phone_number] = set()
+        with self._lock:
+            # Inicializar conjunto se não existir
+            if phone_number not in self.processed_messages:
+                self.processed_messages[phone_number] = set()
+        
+            # Adicionar message_id
+            message_ids = self.processed_messages[phone_number]
+            if message_id not in message_ids:
+                message_ids.add(message_id)
+                self._processed_total += 1
+        
+            # Limitar tamanho do conjunto (prevenir uso excessivo de memória)
+            if len(message_ids) > self.max_messages_per_user:
+                # Converter para lista, pegar últimos N, converter de volta para set
+                messages_list = list(message_ids)
+                self._set_processed(phone_number, set(messages_list[-self.max_messages_per_user:]))
+                logger.debug(f"Limitado histórico de mensagens para {phone_number}")
+    
+    def save_snapshot(self) -> int:
+        """
+        Grava as sessões em memória em SESSION_SNAPSHOT_PATH.<pid>
+        (um arquivo por worker, escrita atômica via arquivo temporário).
+        
+        Returns:
+            int: Número de sessões gravadas
+        """
+        if not self.snapshot_path:
+            return 0
+        with self._lock:
+            entries = [self._serialize(phone) for phone in self.sessions]
+        if not entries:
+            return 0
+        data = zlib.compress(pickle.dumps(entries, pickle.HIGHEST_PROTOCOL), 1)
+        path = f"{self.snapshot_path}.{os.getpid()}"
+        tmp_path = f"{path}.tmp"
+        try:
+            directory = os.path.dirname(self.snapshot_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)  # sessões contêm token
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Erro ao salvar snapshot de sessoes: {e}")
+            return 0
+        return len(entries)
+    
+    def load_snapshot(self) -> int:
+        """
+        Carrega as sessões do snapshot de um worker anterior (aquecimento).
+        
+        Cada worker reivindica um único arquivo renomeando-o (só um
+        consegue), então cada sessão volta para um worker só. Arquivos
+        mais antigos que o timeout da sessão são apagados.
+        
+        Returns:
+            int: Número de sessões carregadas (ignora expiradas)
+        """
+        if not self.snapshot_path:
+            return 0
+        claimed = self._claim_snapshot()
+        if claimed is None:
+            return 0
+        try:
+            with open(claimed, "rb") as f:
+                entries = pickle.loads(zlib.decompress(f.read()))
+        except Exception as e:
+            logger.error(f"Erro ao carregar snapshot de sessoes: {e}")
+            return 0
+        finally:
+            try:
+                os.remove(claimed)
+            except OSError:
+                pass
+        
+        cutoff = datetime.now() - timedelta(minutes=self.timeout_minutes)
+        loaded = 0
+        with self._lock:
+            # Gravadas da menos para a mais recente; entram antes das sessões
+            # que já chegaram neste processo, preservando a ordem LRU
+            for blob in reversed(entries):
+                session, message_ids = pickle.loads(blob)
+                phone = session.phone_number
+                if session.last_activity < cutoff or phone in self.sessions:
+                    continue
+                self.sessions[phone] = session
+                self.sessions.move_to_end(phone, last=False)
+                self._set_processed(phone, message_ids)
+                self._set_size(phone, len(blob))
+                loaded += 1
+            self._enforce_limits()
+        logger.info(f"{loaded} sessoes carregadas do snapshot de {self.snapshot_path}")
+        return loaded
+    
+    def _claim_snapshot(self) -> Optional[str]:
+        """Renomeia o snapshot mais recente para uso exclusivo deste worker"""
+        cutoff = time.time() - self.timeout_minutes * 60
+        candidates = []
+        # SESSION_SNAPSHOT_PATH.<pid> e o arquivo único das versões anteriores
+        for path in [self.snapshot_path] + glob.glob(f"{glob.escape(self.snapshot_path)}.*"):
+            suffix = path[len(self.snapshot_path) + 1:]
+            if suffix and not suffix.isdigit():
+                continue  # .tmp, .loading
+            try:
+                candidates.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        
+        claimed = f"{self.snapshot_path}.{os.getpid()}.loading"
+        for mtime, path in sorted(candidates, reverse=True):
+            try:
+                if mtime < cutoff:
+                    os.remove(path)
+                    continue
+                os.rename(path, claimed)
+                return claimed
+            except OSError:
+                continue  # reivindicado ou apagado por outro worker
+        return None
+    
+    def _serialize(self, phone_number: str) -> bytes:
+        session = self.sessions[phone_number]
+        message_ids = self.processed_messages.get(phone_number, set())
+        return pickle.dumps((session, message_ids), pickle.HIGHEST_PROTOCOL)
+    
+    def _set_processed(self, phone_number: str, message_ids: Optional[Set[str]]) -> None:
+        """Substitui (ou remove, se vazio) os IDs processados do telefone"""
+        previous = self.processed_messages.pop(phone_number, None)
+        if previous:
+            self._processed_total -= len(previous)
+        if message_ids:
+            self.processed_messages[phone_number] = message_ids
+            self._processed_total += len(message_ids)
+    
+    def _set_size(self, phone_number: str, size: int) -> None:
+        self._resident_bytes += size - self._sizes.pop(phone_number, 0)
+        if size:
+            self._sizes[phone_number] = size
+    
+    def _make_resident(self, phone_number: str) -> bool:
+        """Garante a sessão em memória, recarregando do disco se preciso (chamado com o lock)"""
+        if phone_number in self.sessions:
+            return True
+        if self.spill is None:
+            return False
         
-        # Adicionar message_id
-        self.processed_messages[phone_number].add(message_id)
+        try:
+            data = self.spill.pop(phone_number)
+            if data is None:
+                return False
+            data = zlib.decompress(data)
+            session, message_ids = pickle.loads(data)
+        except Exception as e:
+            self.counters["spill_errors"] += 1
+            logger.error(f"Erro ao recarregar sessao de {phone_number}: {e}")
+            return False
         
-        # Limitar tamanho do conjunto (prevenir uso excessivo de memória)
-        if len(self.processed_messages[phone_number]) > self.max_messages_per_user:
-            # Converter para lista, pegar últimos N, converter de volta para set
-            messages_list = list(self.processed_messages[phone_number])
-            self.processed_messages[phone_number] = set(messages_list[-self.max_messages_per_user:])
-            logger.debug(f"Limitado histórico de mensagens para {phone_number}")
+        if datetime.now() - session.last_activity > timedelta(minutes=self.timeout_minutes):
+            self._notify_end(phone_number)
+            logger.info(f"Sessao expirada removida: {phone_number}")
+            return False
+        
+        self.sessions[phone_number] = session
+        self._set_processed(phone_number, message_ids)
+        self._set_size(phone_number, len(data))
+        self.counters["reloads"] += 1
+        logger.debug(f"Sessao recarregada do disco: {phone_number}")
+        return True
+    
+    def _enforce_limits(self) -> None:
+        """Remove da memória as sessões menos recentes acima dos limites (chamado com o lock)"""
+        if len(self.sessions) <= self.max_resident and self._resident_bytes <= self.max_bytes:
+            return
+        
+        # Percorre só o início (menos recentes) até liberar o suficiente
+        victims = []
+        count, size = len(self.sessions), self._resident_bytes
+        for phone in self.sessions:
+            if count <= self.max_resident and size <= self.max_bytes:
+                break
+            if phone not in self._in_use:
+                victims.append(phone)
+                count -= 1
+                size -= self._sizes.get(phone, 0)
+        
+        for phone in victims:
+            self._evict(phone)
+    
+    def _evict(self, phone_number: str) -> None:
+        if self.spill is not None:
+            try:
+                data = zlib.compress(self._serialize(phone_number), 1)
+                last_activity = self.sessions[phone_number].last_activity.timestamp()
+                self.spill.put(phone_number, data, last_activity)
+                self.counters["evictions"] += 1
+            except Exception as e:
+                self.counters["spill_errors"] += 1
+                self.counters["dropped"] += 1
+                logger.error(f"Erro ao gravar sessao de {phone_number} em disco: {e}")
+        else:
+            self.counters["dropped"] += 1
+        
+        del self.sessions[phone_number]
+        self._set_processed(phone_number, None)
+        self._set_size(phone_number, 0)
+    
+    def _spilled_count(self) -> int:
+        if self.spill is None:
+            return 0
+        try:
+            return self.spill.count()
+        except Exception:
+            return 0
     
     def _cleanup_expired(self):
         """Remove sessões expiradas pelo timeout"""
         now = datetime.now()
         expired = []
         
+        # Ordem de atividade: as expiradas estão no início
         for phone, session in self.sessions.items():
-            if now - session.last_activity > timedelta(minutes=self.timeout_minutes):
+            if now - session.last_activity <= timedelta(minutes=self.timeout_minutes):
+                break
+            if phone not in self._in_use:
                 expired.append(phone)
         
         for phone in expired:
             del self.sessions[phone]
+            self._set_size(phone, 0)
             
             # Limpar mensagens processadas também
-            if phone in self.processed_messages:
-                del self.processed_messages[phone]
+            self._set_processed(phone, None)
+            self._notify_end(phone)
             
             logger.info(f"Sessao expirada removida: {phone}")
+        
+        if self.spill is not None:
+            try:
+                cutoff = (now - timedelta(minutes=self.timeout_minutes)).timestamp()
+                removed = self.spill.purge(cutoff)
+                for phone in removed:
+                    self._notify_end(phone)
+                if removed:
+                    logger.info(f"{len(removed)} sessoes expiradas removidas do disco")
+            except Exception as e:
+                logger.error(f"Erro ao limpar sessoes em disco: {e}")
     
     def _auto_cleanup(self):
         """
@@ -148,16 +540,24 @@ class SessionManager:
     
     def get_stats(self) -> dict:
         """
-        Retorna estatísticas do gerenciador de sessões.
+        Retorna estatísticas do gerenciador de sessões (O(1)).
         
         Returns:
             dict: Estatísticas incluindo número de sessões e mensagens
         """
-        return {
-            "active_sessions": len(self.sessions),
-            "tracked_users": len(self.processed_messages),
-            "total_processed_messages": sum(len(msgs) for msgs in self.processed_messages.values())
-        }
+        with self._lock:
+            minutes = max((time.monotonic() - self._started_at) / 60.0, 1 / 60.0)
+            return {
+                "active_sessions": len(self.sessions),
+                "spilled_sessions": self._spilled_count(),
+                "in_use_sessions": len(self._in_use),
+                "resident_bytes": self._resident_bytes,
+                "tracked_users": len(self.processed_messages),
+                "total_processed_messages": self._processed_total,
+                **self.counters,
+                "evictions_per_minute": round(self.counters["evictions"] / minutes, 2),
+                "reloads_per_minute": round(self.counters["reloads"] / minutes, 2)
+            }
 
 # Instância global (compartilhada apenas dentro do worker)
 session_manager = SessionManager()
\ No newline at end of file
@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """
+    Aquecimento opcional do processo (WARMUP_ENABLED).
+
+    A importação do app só monta objetos baratos; clientes HTTP,
+    numpy e caches em disco são carregados no primeiro uso. Com o
+    aquecimento ligado, esses passos rodam numa thread logo após a
+    importação e /ready só responde 200 quando terminam, para o
+    balanceador não mandar tráfego a um processo ainda frio.
+
+    Um passo que falha é registrado, mas não impede o processo de
+    ficar pronto (o recurso volta a ser carregado no primeiro uso).
+    """
+
+    def __init__(self):
+        self.enabled = Config.WARMUP_ENABLED
+        self.steps: List[Tuple[str, Callable[[], object]]] = []
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self._done = threading.Event()
+
+    def add(self, name: str, step: Callable[[], object]) -> None:
+        self.steps.append((name, step))
+
+    def start(self) -> None:
+        if not self.enabled:
+            self._finish()
+            return
+        threading.Thread(target=self._run, name="warmup", daemon=True).start()
+
+    def _run(self) -> None:
+        for name, step in self.steps:
+            started_at = time.monotonic()
+            try:
+                step()
+            except Exception as e:
+                self.errors[name] = str(e)
+                logger.error(f"[WARMUP] Falha em {name}: {e}")
+            self.timings[name] = round((time.monotonic() - started_at) * 1000, 1)
+        self._finish()
+
+    def _finish(self) -> None:
+        self.finished_at = time.monotonic()
+        self._done.set()
+        logger.info(f"Chatbot WhatsApp pronto ({(self.finished_at - self.started_at) * 1000:.0f} ms apos a importacao)")
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "ready_after_ms": round((self.finished_at - self.started_at) * 1000, 1) if self.finished_at else None,
+            "steps_ms": dict(self.timings),
+            "errors": dict(self.errors)
+        }
+
+# Instância global
+warmup = Warmup()